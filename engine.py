@@ -6,17 +6,65 @@
 A Katana engine for Tank.
 """
 import os
+import imp
 import sys
 import traceback
 import getpass
+import threading
 
 import tank
 import tank.context
 import tank.platform
-from rdokatana.taskChooser import taskChooser
 
+# Only import what batch and farm sessions need at module level, UI modules are imported when used
 from Katana import Configuration
-from Katana import Callbacks
+
+
+# Steps in which the task of an entity context is looked up, by entity type, from the most to the least preferred,
+# when the "task_step_preferences" setting is not set
+DEFAULT_TASK_STEP_PREFERENCES = {
+    'Shot': ['Lgt'],
+    'Asset': ['Shd'],
+}
+
+# Steps offered by the task chooser when the "task_chooser_steps" setting is not set
+DEFAULT_TASK_CHOOSER_STEPS = ['Lgt', 'Shd', 'FX']
+
+# Statuses of the tasks which are not worked on anymore, only chosen when there is no active task
+INACTIVE_TASK_STATUSES = ('omt', 'na', 'fin')
+
+# Environment variable starting the engine in headless mode in batch sessions, see KatanaEngine.is_headless
+HEADLESS_ENV_VAR = 'TK_KATANA_HEADLESS'
+
+
+def import_engine_module(name):
+    """
+    Imports a standalone module of the engine with the loader of python/tk_katana/standalone.py.
+    :param name: the name of the module, e.g. "task_cache".
+    :return: the module.
+    """
+    loader = sys.modules.get("tk_katana_standalone")
+    if loader is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python", "tk_katana", "standalone.py")
+        loader = imp.load_source("tk_katana_standalone", path)
+    return loader.import_engine_module(name)
+
+
+class HeadlessEnvironment(object):
+    """
+    Wraps the environment given to the engine in headless mode, so that the core only loads the apps listed in the
+    "headless_apps" setting.
+    """
+
+    def __init__(self, env, app_instance_names):
+        self._env = env
+        self._app_instance_names = app_instance_names
+
+    def get_apps(self, engine):
+        return [app for app in self._env.get_apps(engine) if app in self._app_instance_names]
+
+    def __getattr__(self, name):
+        return getattr(self._env, name)
 
 
 class KatanaEngine(tank.platform.Engine):
@@ -27,17 +75,44 @@ class KatanaEngine(tank.platform.Engine):
     conform context, destroy it and recreate it with a proper one, we need to enforce a proper context before calling
     super(KatanaEngine, self).__init__(*args, **kwargs). Hence, newContext = self.validate_context(tank, context)
     """
+    # HumanUser records of the current user, keyed by (Shotgun site, login). Shared by all the engine
+    # instances of the process, since the engine is recreated on each file open.
+    _current_users = {}
 
     def __init__(self, *args, **kwargs):
         self._ui_enabled = Configuration.get('KATANA_UI_MODE')
-        tk = args[0]
+        # reuse the Tank instance, and its Shotgun connection, of the previous engine instances of the process
+        tk = import_engine_module("tank_pool").get_pool().get(args[0])
         context = args[1]
+        # get_setting is only available once the engine is initialized, read the settings from the environment
+        # for the context validation
+        try:
+            self._startup_settings = args[3].get_engine_settings(args[2]) or {}
+        except (IndexError, AttributeError):
+            self._startup_settings = {}
+        # log_debug is called on hot paths, the debug_logging setting is only read at startup
+        self._debug_logging = bool(self._startup_settings.get('debug_logging', False))
+        self._logger = import_engine_module("log_backend").get_logger()
+        self._headless = not self._ui_enabled and os.environ.get(HEADLESS_ENV_VAR) in ('1', 'true')
+        if self._headless and len(args) > 3:
+            args = args[:3] + (HeadlessEnvironment(args[3], self._startup_settings.get('headless_apps') or []),) + args[4:]
+        # Shotgun data fetched in the background by the init script, consumed by validate_context
+        self._prefetch = import_engine_module("prefetch").take(context)
+        self._profiler = import_engine_module("profiler").get_profiler()
+        # count the Shotgun calls made by the engine, the apps, the hooks and the asset plug-in
+        shotgun_stats = import_engine_module("shotgun_stats").get_stats()
+        shotgun_stats.instrument(tk.shotgun)
+        if self._profiler.enabled:
+            shotgun_stats.add_listener(self._profiler.record_shotgun_call)
         # if the context is not set properly, forces the user to set it before launching the engine.
-        newContext = self.validate_context(tk, context)
+        with self._profiler.phase("validate_context"):
+            newContext = self.validate_context(tk, context)
         tmp = list(args)
+        tmp[0] = tk
         tmp[1] = newContext
         args = tuple(tmp)
-        super(KatanaEngine, self).__init__(*args, **kwargs)
+        with self._profiler.phase("engine_init"):
+            super(KatanaEngine, self).__init__(*args, **kwargs)
 
     @property
     def has_ui(self):
@@ -46,8 +121,25 @@ class KatanaEngine(tank.platform.Engine):
         """
         return self._ui_enabled
 
+    @property
+    def is_headless(self):
+        """
+        Whether the engine runs in headless mode, for farm renders. Headless mode is enabled by setting the
+        TK_KATANA_HEADLESS environment variable to 1 in a batch session. In headless mode, only the apps listed in
+        the "headless_apps" setting are loaded, none by default, and Qt is not set up.
+        """
+        return self._headless
+
     def init_engine(self):
+        self._debug_logging = bool(self.get_setting("debug_logging", False))
+        if self.get_setting("log_json_output", False):
+            import_engine_module("log_backend").set_json_output(True)
         self.log_debug("%s: Initializing..." % self)
+        if self._prefetch:
+            self.log_debug(self._prefetch.report())
+        self.log_debug("Tank pool: %s" % self.get_tank_pool().stats())
+        if self.is_headless and not self.get_setting("headless_apps"):
+            self.log_warning("Running in headless mode with an empty headless_apps setting: no app is loaded.")
         os.environ["TANK_KATANA_ENGINE_INIT_NAME"] = self.instance_name
 
     def _define_qt_base(self):
@@ -67,6 +159,10 @@ class KatanaEngine(tank.platform.Engine):
 
         base = {"qt_core": QTProxy(), "qt_gui": QTProxy(), "dialog_base": None}
 
+        if self.is_headless:
+            # no app shows a UI on the farm, don't pay for the PyQt import
+            return base
+
         try:
             from PyQt4 import QtCore, QtGui
             import PyQt4
@@ -97,23 +193,41 @@ class KatanaEngine(tank.platform.Engine):
         if self.get_setting("use_sgtk_as_menu_name", False):
             menu_name = "Sgtk"
 
-        tk_katana = self.import_module("tk_katana")
-        self._menu_generator = tk_katana.MenuGenerator(self, menu_name)
-        self._menu_generator.create_menu()
+        with self._profiler.phase("add_katana_menu"):
+            tk_katana = self.import_module("tk_katana")
+            self._menu_generator = tk_katana.MenuGenerator(self, menu_name)
+            self._menu_generator.create_menu()
+        self._profiler.finish("menu")
 
     def pre_app_init(self):
         """
         Called at startup.
         """
-        tk_katana = self.import_module("tk_katana")
+        # tk_katana is only needed to build the menu, don't pay for its Qt imports in batch sessions
+        if self.has_ui:
+            with self._profiler.phase("pre_app_init"):
+                tk_katana = self.import_module("tk_katana")
+        # time the apps loaded by the core between pre_app_init and post_app_init
+        self._restore_app_loading = self._profiler.instrument_app_loading()
+        self._profiler.start_phase("load_apps")
 
 
     def post_app_init(self):
+        self._profiler.end_phase("load_apps")
+        self._restore_app_loading()
+        with self._profiler.phase("post_app_init"):
+            self._post_app_init()
+
+    def _post_app_init(self):
+        self.register_command(
+            "Dump Shotgun Call Statistics", self.log_shotgun_stats, {"type": "context_menu"}
+        )
         if self.has_ui:
             try:
                 self.add_katana_menu()
             except AttributeError:
                 # Katana is probably not fully started and the main menu is not available yet
+                from Katana import Callbacks
                 Callbacks.addCallback(Callbacks.Type.onStartupComplete, self.add_katana_menu)
             except:
                 traceback.print_exc()
@@ -134,9 +248,13 @@ class KatanaEngine(tank.platform.Engine):
                 newContext = self.userChosenContext(tk, context)
                 return newContext
             elif context.entity and not context.task:
+                newContext = self.getCachedTaskContext(tk, context)
+                if newContext:
+                    return newContext
                 task = self.getTask(tk, context)
                 if task:
                     newContext = tk.context_from_entity('Task', task['id'])
+                    self.cacheTaskContext(tk, context, newContext)
                     return newContext
                 elif self._ui_enabled:
                     newContext = self.userChosenContext(tk, context)
@@ -145,48 +263,232 @@ class KatanaEngine(tank.platform.Engine):
                 return context
         return context
 
+    def getTaskStepShortNames(self, context):
+        '''
+        Returns the short names of the steps in which the task of an entity context is looked up, from the most to
+        the least preferred, as configured by the "task_step_preferences" setting.
+        :param context: an entity context.
+        :type context: :class:`tank.context.Context`
+        :rtype: list
+        '''
+        preferences = self._startup_settings.get('task_step_preferences') or DEFAULT_TASK_STEP_PREFERENCES
+        return list(preferences.get(context.entity['type'], []))
+
+    def getTaskContextCache(self):
+        '''
+        Returns the on-disk cache of the task contexts resolved for entity contexts, or None if it is disabled
+        with a "task_context_cache_ttl" setting of 0.
+        :rtype: TaskContextCache
+        '''
+        ttl = self._startup_settings.get("task_context_cache_ttl", 86400)
+        if not ttl:
+            return None
+        task_cache = import_engine_module("task_cache")
+        return task_cache.TaskContextCache(os.path.join(task_cache.get_cache_dir(), "task_contexts.json"), ttl)
+
+    def getTaskContextKey(self, tk, context):
+        '''
+        Returns the key of the task context of an entity context in the task context cache. Task contexts are cached
+        per Shotgun site and pipeline configuration, since a context is bound to the templates of its configuration.
+        :param tk: the Tank object instance the engine runs on.
+        :type tk: :class:`sgtk.tank.Tank`
+        :param context: an entity context.
+        :type context: :class:`tank.context.Context`
+        :rtype: str
+        '''
+        task_cache = import_engine_module("task_cache")
+        return task_cache.get_task_context_key(
+            context, self.getTaskStepShortNames(context), getpass.getuser(), tk.shotgun.base_url,
+            tk.pipeline_configuration.get_path()
+        )
+
+    def getCachedTaskContext(self, tk, context):
+        '''
+        Returns the task context resolved for the given entity context by a previous Katana session, or None.
+        On a cache hit, the task is looked up again in the background to keep the cache up to date.
+        :param tk: a Tank object instance.
+        :type tk: :class:`sgtk.tank.Tank`
+        :param context: an entity context.
+        :type context: :class:`tank.context.Context`
+        :rtype: :class:`tank.context.Context`
+        '''
+        cache = self.getTaskContextCache()
+        if cache is None:
+            return None
+        context_fields = cache.get(self.getTaskContextKey(tk, context))
+        if not context_fields:
+            return None
+        try:
+            # built on the engine's Tank instance, deserializing would create another one
+            newContext = tank.context.Context(tk, **context_fields)
+        except Exception, e:
+            self.log_warning("Ignoring invalid cached task context: %s" % e)
+            return None
+
+        refresh = threading.Thread(target=self.refreshCachedTaskContext, args=(tk, context, newContext))
+        refresh.daemon = True
+        refresh.start()
+        return newContext
+
+    def cacheTaskContext(self, tk, context, taskContext):
+        '''
+        Stores the task context resolved for an entity context in the task context cache.
+        :param tk: the Tank object instance the engine runs on.
+        :type tk: :class:`sgtk.tank.Tank`
+        :param context: an entity context.
+        :type context: :class:`tank.context.Context`
+        :param taskContext: the task context resolved for it.
+        :type taskContext: :class:`tank.context.Context`
+        '''
+        cache = self.getTaskContextCache()
+        if cache is None:
+            return
+        task_cache = import_engine_module("task_cache")
+        cache.set(self.getTaskContextKey(tk, context), task_cache.get_context_fields(taskContext))
+
+    def refreshCachedTaskContext(self, tk, context, cachedContext):
+        '''
+        Looks up the task of an entity context and updates the task context cache: the entry is dropped if there is
+        no task anymore or no task stands out, and replaced if another task was chosen. Runs in a background thread.
+        Shotgun connections are not thread safe, so unless the candidate tasks and the current user were prefetched,
+        the lookup uses its own Tank instance and Shotgun connection.
+        :param tk: a Tank object instance.
+        :type tk: :class:`sgtk.tank.Tank`
+        :param context: an entity context.
+        :type context: :class:`tank.context.Context`
+        :param cachedContext: the task context found in the cache for it.
+        :type cachedContext: :class:`tank.context.Context`
+        '''
+        try:
+            refresh_tk = None
+            if not self.hasPrefetchedTaskData():
+                refresh_tk = tank.tank_from_path(tk.pipeline_configuration.get_path())
+            task = self.getTask(refresh_tk or tk, context)
+            if not task:
+                cache = self.getTaskContextCache()
+                if cache is not None:
+                    cache.delete(self.getTaskContextKey(tk, context))
+            elif cachedContext.task and task['id'] == cachedContext.task['id']:
+                # still the same task, only renew the entry
+                self.cacheTaskContext(tk, context, cachedContext)
+            else:
+                if refresh_tk is None:
+                    refresh_tk = tank.tank_from_path(tk.pipeline_configuration.get_path())
+                self.cacheTaskContext(tk, context, refresh_tk.context_from_entity('Task', task['id']))
+        except Exception, e:
+            self.log_warning("Failed to refresh the cached task context: %s" % e)
+
+    def hasPrefetchedTaskData(self):
+        '''
+        Returns whether the candidate tasks and the current user were prefetched successfully, in which case getTask
+        does not query Shotgun.
+        :rtype: bool
+        '''
+        if not self._prefetch:
+            return False
+        try:
+            self._prefetch.tasks.result()
+            self._prefetch.current_user.result()
+        except Exception:
+            return False
+        return True
+
     def getTask(self, tk, context):
-        stepShortName = ''
-        if context.entity['type'] == 'Shot':
-            stepShortName = 'Lgt'
-        elif context.entity['type'] == 'Asset':
-            stepShortName = 'Shd'
+        '''
+        Returns the task to work on for an entity context, or None if there is no task or no task stands out.
+        The tasks of all the preferred steps are fetched in a single query and scored by getTaskScore.
+        :param tk: a Tank object instance.
+        :type tk: :class:`sgtk.tank.Tank`
+        :param context: an entity context.
+        :type context: :class:`tank.context.Context`
+        :rtype: dict
+        '''
+        stepShortNames = self.getTaskStepShortNames(context)
+        if not stepShortNames:
+            return
         filters = [
             ['project', 'is', context.project],
             ['entity', 'is', context.entity],
-            ['step.Step.short_name', 'is', stepShortName]
+            ['step.Step.short_name', 'in', stepShortNames]
         ]
-        tasks = tk.shotgun.find("Task", filters, ['task_assignees'])
+        tasks = self.getPrefetchedTasks(stepShortNames)
+        if tasks is None:
+            tasks = tk.shotgun.find("Task", filters, ['task_assignees', 'step.Step.short_name', 'sg_status_list'])
         if not tasks:
             return
         if len(tasks) == 1:
             return tasks[0]
-        task = self.getAssignedTask(tk, tasks)
-        return task
-
-    def getAssignedTask(self, tk, tasks):
-        userIds = []
-        for task in tasks:
-            userIds.extend([u['id'] for u in task['task_assignees']])
-
-        users = dict((p['id'], p['login']) for p in tk.shotgun.find("HumanUser", [['id', 'in', userIds]],
-                                                                ['login']))
-        currentUser = getpass.getuser()
-        if currentUser not in users.values():
-            return
-        tasksAssigned = []
-        for task in tasks:
-            userLogins = [users[u['id']] for u in task['task_assignees'] ]
-            if currentUser in userLogins:
-                tasksAssigned.append(task)
-        if not tasksAssigned or len(tasksAssigned) > 1:
+
+        currentUser = self.getCurrentUser(tk)
+        scoredTasks = sorted(((self.getTaskScore(task, stepShortNames, currentUser), task) for task in tasks),
+                             key=lambda x: x[0], reverse=True)
+        if scoredTasks[0][0] == scoredTasks[1][0]:
+            # ambiguous, let the user choose
             return
-        else:
-            return tasksAssigned[0]
+        return scoredTasks[0][1]
+
+    def getPrefetchedTasks(self, stepShortNames):
+        '''
+        Returns the candidate tasks prefetched at startup that belong to the given steps, or None if the tasks were
+        not prefetched or the prefetch failed.
+        :param stepShortNames: the short names of the candidate steps.
+        :type stepShortNames: list
+        :rtype: list
+        '''
+        if not self._prefetch:
+            return None
+        try:
+            tasks = self._prefetch.tasks.result()
+        except Exception, e:
+            self.log_warning("Task prefetch failed, querying Shotgun: %s" % e)
+            return None
+        return [task for task in tasks if task.get('step.Step.short_name') in stepShortNames]
+
+    def getTaskScore(self, task, stepShortNames, currentUser):
+        '''
+        Returns the score of a candidate task, the task with the highest score being the one to work on.
+        Tasks assigned to the current user come first, then tasks of the most preferred steps, then active tasks.
+        :param task: a Task entity, with its task_assignees, step.Step.short_name and sg_status_list fields.
+        :type task: dict
+        :param stepShortNames: the short names of the candidate steps, from the most to the least preferred.
+        :type stepShortNames: list
+        :param currentUser: the HumanUser entity of the current user, or None.
+        :type currentUser: dict
+        :rtype: tuple
+        '''
+        assigned = False
+        if currentUser:
+            userIds = [u['id'] for u in task['task_assignees'] if u['type'] == 'HumanUser']
+            assigned = currentUser['id'] in userIds
+        stepShortName = task.get('step.Step.short_name')
+        stepRank = stepShortNames.index(stepShortName) if stepShortName in stepShortNames else len(stepShortNames)
+        active = task.get('sg_status_list') not in INACTIVE_TASK_STATUSES
+        return (assigned, -stepRank, active)
+
+    def getCurrentUser(self, tk):
+        '''
+        Returns the HumanUser entity of the user running Katana, or None if it does not exist in Shotgun.
+        The entity is only fetched once per process.
+        :param tk: a Tank object instance.
+        :type tk: :class:`sgtk.tank.Tank`
+        :rtype: dict
+        '''
+        login = getpass.getuser()
+        key = (tk.shotgun.base_url, login)
+        if key not in self._current_users and self._prefetch:
+            try:
+                self._current_users[key] = self._prefetch.current_user.result()
+            except Exception, e:
+                self.log_warning("Current user prefetch failed, querying Shotgun: %s" % e)
+        if key not in self._current_users:
+            self._current_users[key] = tk.shotgun.find_one("HumanUser", [['login', 'is', login]], ['login'])
+        return self._current_users[key]
 
 
     def userChosenContext(self, tk, context):
-        stepShortNames = ['Lgt', 'Shd', 'FX']
+        from rdokatana.taskChooser import taskChooser
+
+        stepShortNames = self._startup_settings.get('task_chooser_steps') or DEFAULT_TASK_CHOOSER_STEPS
         tc = taskChooser.TaskChooser(context, stepShortNames)
         status = tc.exec_()
         if status == 0: # value of PyQt4.QtGui.QDialog.Rejected. We do not want to import that module at this point.
@@ -204,6 +506,28 @@ class KatanaEngine(tank.platform.Engine):
             except:
                 traceback.print_exc()
 
+    def get_tank_pool(self):
+        """
+        Returns the process-wide pool of Tank instances, keyed by pipeline configuration, which hooks should use
+        instead of creating their own Tank instances. See python/tk_katana/tank_pool.py.
+        """
+        return import_engine_module("tank_pool").get_pool()
+
+    def get_shotgun_stats(self):
+        """
+        Returns the statistics of the Shotgun calls made by the process: the number of calls, failures and the
+        latency histogram of each method per entity type. See python/tk_katana/shotgun_stats.py.
+
+        :rtype: dict
+        """
+        return import_engine_module("shotgun_stats").get_stats().report()
+
+    def log_shotgun_stats(self):
+        """
+        Logs the statistics of the Shotgun calls made by the process, the slowest first.
+        """
+        self.log_info(import_engine_module("shotgun_stats").get_stats().format_report())
+
     def launch_command(self, cmd_id):
         callback = self._callback_map.get(cmd_id)
         if callback is None:
@@ -214,15 +538,18 @@ class KatanaEngine(tank.platform.Engine):
     #####################################################################################
     # Logging
 
+    # Messages are handed to the "tk-katana" logger, whose handler writes them from a background thread, see
+    # python/tk_katana/log_backend.py.
+
     def log_debug(self, msg):
-        if self.get_setting("debug_logging", False):
-            print "Shotgun Debug: %s" % msg
+        if self._debug_logging:
+            self._logger.debug(msg)
 
     def log_info(self, msg):
-        print "Shotgun Info: %s" % msg
+        self._logger.info(msg)
 
     def log_warning(self, msg):
-        print "Shotgun Warning: %s" % msg
+        self._logger.warning(msg)
 
     def log_error(self, msg):
-        print "Shotgun Error: %s" % msg
+        self._logger.error(msg)
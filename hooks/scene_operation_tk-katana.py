@@ -105,7 +105,9 @@ class SceneOperation(Hook):
             env = context.tank.pipeline_configuration.get_environment("project", context=context)
 
         name = "tk-katana" # TODO: Get this properly?
-        new_katana_engine = engine.KatanaEngine(context.tank, context, name, env)
+        # Reuse the Tank instance of the current engine rather than setting up a new one
+        tk = self.parent.engine.get_tank_pool().get(context.tank)
+        new_katana_engine = engine.KatanaEngine(tk, context, name, env)
         new_katana_engine.add_katana_menu()
 
 
@@ -125,8 +125,8 @@ class KatanaActions(HookBaseClass):
         if not os.path.exists(path):
             raise Exception("File not found on disk - '%s'" % path)
                 
-        project_path = "/mnt/netdev/sam.saxon/shotgun/Shotgun_Katana_Test/big_buck_bunny" # TODO: Hardcoded == not cool
-        tk = sgtk.tank_from_path( project_path )
+        # Find the project of the publish among the pooled Tank instances, only set up a new one for other projects
+        tk = self.parent.engine.get_tank_pool().tank_from_path( path )
 
         # Setup shotgun asset string
         template = tk.template_from_path( path )
@@ -11,6 +11,13 @@
 import os
 import sys
 
+# Environment variable starting the engine in headless mode, see KatanaEngine.is_headless
+HEADLESS_ENV_VAR = "TK_KATANA_HEADLESS"
+
+# Holds the value of HEADLESS_ENV_VAR replaced by bootstrap for a headless launch, empty if it was not set. It is
+# kept in the environment rather than in this module, which the launcher may load again for each launch.
+HEADLESS_SAVED_ENV_VAR = "TK_KATANA_HEADLESS_SAVED"
+
 def bootstrap(engine_name, context, app_path, app_args, extra_args):
     """
     Setup the environment for Katana
@@ -23,4 +30,17 @@ def bootstrap(engine_name, context, app_path, app_args, extra_args):
 
     # add to the katana startup env
     sgtk.util.append_path_to_env_var("KATANA_RESOURCES", startup_path)
+
+    # start the engine in headless mode, e.g. for farm renders. The launcher process is long-lived, so the value
+    # set for a headless launch is undone on the next launches, leaving alone one set by a farm wrapper or the user.
+    if extra_args and extra_args.get("headless"):
+        if HEADLESS_SAVED_ENV_VAR not in os.environ:
+            os.environ[HEADLESS_SAVED_ENV_VAR] = os.environ.get(HEADLESS_ENV_VAR, "")
+        os.environ[HEADLESS_ENV_VAR] = "1"
+    elif HEADLESS_SAVED_ENV_VAR in os.environ:
+        previous = os.environ.pop(HEADLESS_SAVED_ENV_VAR)
+        if previous:
+            os.environ[HEADLESS_ENV_VAR] = previous
+        else:
+            os.environ.pop(HEADLESS_ENV_VAR, None)
     return (app_path, app_args)
\ No newline at end of file
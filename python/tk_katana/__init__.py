@@ -8,9 +8,7 @@ import tank
 import traceback
 
 from Katana import Configuration
-from Katana import FarmAPI 
-from Katana import Callbacks
-from Katana import QtGui, QtCore
+from Katana import QtGui
 
 from .menu_generation import MenuGenerator
 
@@ -41,7 +39,7 @@ def __create_tank_disabled_menu(details):
     if Configuration.get("KATANA_UI_MODE"):
         sg_menu = MenuGenerator.get_or_create_root_menu("Shotgun")
         if sg_menu is not None:
-            sg_menu.clear()
+            MenuGenerator.clear_root_menu(sg_menu)
             cmd = lambda d=details: __show_tank_disabled_message(d)
             action = QtGui.QAction("Toolkit is disabled", sg_menu, triggered=cmd)
             sg_menu.addAction(action)
@@ -65,7 +63,7 @@ def __create_tank_error_menu():
     if Configuration.get("KATANA_UI_MODE"):
         sg_menu = MenuGenerator.get_or_create_root_menu("Shotgun")
         if sg_menu is not None:
-            sg_menu.clear()
+            MenuGenerator.clear_root_menu(sg_menu)
             cmd = lambda m=message: __show_tank_message("Shotgun Pipeline Toolkit caught an error", m)
             action = QtGui.QAction("[Shotgun Error - Click for details]", sg_menu, triggered=cmd)
             sg_menu.addAction(action)
@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Logging backend of the Katana engine.
+
+Messages go through the standard logging module to a handler which only puts
+them in a queue; a background thread writes them to stdout, so that hot paths
+never block on terminal or NFS log writes. Messages are formatted as the
+engine always printed them ("Shotgun Info: ..."), or as JSON lines with a
+timestamp and the thread name for farm log aggregation when the
+TK_KATANA_LOG_JSON environment variable is set or json_output is requested.
+
+A standalone module, see standalone.py.
+"""
+import os
+import sys
+import json
+import time
+import Queue
+import atexit
+import logging
+import threading
+
+
+# Name of the logger of the engine
+LOGGER_NAME = "tk-katana"
+
+# Environment variable enabling the JSON output
+JSON_ENV_VAR = "TK_KATANA_LOG_JSON"
+
+# Labels of the levels in the text output
+_LEVEL_LABELS = {
+    logging.DEBUG: "Debug",
+    logging.INFO: "Info",
+    logging.WARNING: "Warning",
+    logging.ERROR: "Error",
+    logging.CRITICAL: "Error",
+}
+
+# The handler and listener installed on the engine logger, see get_logger
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats records as "Shotgun <Level>: <message>".
+    """
+
+    def format(self, record):
+        message = "Shotgun %s: %s" % (_LEVEL_LABELS.get(record.levelno, record.levelname), record.getMessage())
+        if record.exc_text:
+            message = "%s\n%s" % (message, record.exc_text)
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON objects, one per line, with UTC timestamps.
+    """
+    converter = time.gmtime
+
+    def format(self, record):
+        data = {
+            "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + ".%03dZ" % record.msecs,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        # QueueHandler formats the traceback in the calling thread
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data)
+
+
+class QueueHandler(logging.Handler):
+    """
+    Puts the records in a queue without ever blocking. The message is
+    formatted in the calling thread so that the record can be handed over.
+    """
+
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def emit(self, record):
+        try:
+            # resolve the message and drop the arguments and traceback, which may not be thread safe
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """
+    Writes the records of a queue to a handler from a background thread.
+    """
+    _sentinel = None
+
+    def __init__(self, queue, handler):
+        self.queue = queue
+        self.handler = handler
+        self._thread = threading.Thread(target=self._run, name="tk-katana logging")
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._sentinel:
+                break
+            self.handler.handle(record)
+
+    def stop(self):
+        """
+        Writes the pending records and stops the thread.
+        """
+        self.queue.put_nowait(self._sentinel)
+        self._thread.join()
+        self.handler.flush()
+
+
+def use_json():
+    """
+    Returns whether the JSON output is requested by the environment.
+    """
+    return os.environ.get(JSON_ENV_VAR, "").lower() in ("1", "true", "yes", "on")
+
+
+def get_logger():
+    """
+    Returns the logger of the engine, installing the queue handler on its
+    first call.
+    """
+    global _handler, _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _handler is None:
+            queue = Queue.Queue()
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(JsonFormatter() if use_json() else TextFormatter())
+            _listener = QueueListener(queue, stream_handler)
+            _listener.start()
+            atexit.register(_listener.stop)
+
+            _handler = QueueHandler(queue)
+            logger.addHandler(_handler)
+            logger.setLevel(logging.DEBUG)
+            # the engine formats its own messages, don't duplicate them in the root logger
+            logger.propagate = False
+    return logger
+
+
+def set_json_output(enabled):
+    """
+    Switches the output between the text and JSON formats.
+    """
+    get_logger()
+    _listener.handler.setFormatter(JsonFormatter() if enabled else TextFormatter())
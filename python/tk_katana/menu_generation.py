@@ -4,15 +4,51 @@
 #
 import os
 import sys
+import weakref
+import threading
+import subprocess
 import unicodedata
 
 from Katana import QtGui, QtCore
 
 
+# Keys of the menus managed by the generator, see _MenuState. The submenus of the apps are keyed by ("app", app name).
+ROOT_MENU = "root"
+CONTEXT_MENU = "context"
+
+# The icons of the commands, keyed by path, see get_icon
+_icons = {}
+
+
+def get_icon(path):
+    """
+    Returns the icon of the given path, loaded on the first call for that path.
+    """
+    icon = _icons.get(path)
+    if icon is None:
+        icon = _icons[path] = QtGui.QIcon(path)
+    return icon
+
+
+def _weak_widget_ref(widget, invalidate):
+    """
+    Returns a weak reference to a widget, calling invalidate when the widget is destroyed.
+    """
+    widget.destroyed.connect(lambda *args: invalidate())
+    return weakref.ref(widget)
+
+
 class MenuGenerator(object):
     """
     A Katana specific menu generator.
     """
+    # Weak references to the root menus found or created by get_or_create_root_menu, keyed by name, and to Katana's
+    # main menu bar, dropped when the widgets are destroyed
+    _root_menus = {}
+    _main_menu = None
+    # Whether the destroyed signal of the main menu bar is connected. The Python wrapper of the bar may be collected
+    # while the bar lives, so the weak reference alone can't tell whether the bar is already watched.
+    _main_menu_watched = False
 
     def __init__(self, engine, menu_name):
         """
@@ -38,49 +74,57 @@ class MenuGenerator(object):
 
     def create_menu(self):
         """
-        Create the Shotgun Menu.
+        Create the Shotgun Menu, or update it in place if a previous engine instance created it: the actions of the
+        commands which are still registered are kept and only relabeled or given their new callback, the others
+        are added or removed, see _MenuState.
         """
         # Get the shotgun menu
         self.root_menu = self.get_or_create_root_menu(self.menu_name)
+        if self.root_menu is None:
+            # Katana is probably not fully started, see KatanaEngine._post_app_init
+            raise AttributeError("Katana's main menu is not available")
+
+        self._state = _MenuState.get(self.root_menu)
+        self._state.begin()
 
         # 'surfacing, Assets chair' menu
-        menu_handle = self.root_menu
+        root_actions = []
 
         # now add the context item on top of the main menu
-        self._context_menu = self._add_context_menu(menu_handle)
-        menu_handle.addSeparator()
+        self._context_menu = self._add_context_menu()
+        root_actions.append(self._context_menu.menuAction())
+        root_actions.append(self._state.separator(self.root_menu, ROOT_MENU, "context"))
 
         # now enumerate all items and create menu objects for them
+        # index the app instance names by app once, rather than scanning engine.apps for each command
+        app_instance_names = dict((app, name) for (name, app) in self.engine.apps.items())
         menu_items = []
         for (cmd_name, cmd_details) in self.engine.commands.items():
-             menu_items.append(AppCommand(cmd_name, cmd_details))
+             menu_items.append(AppCommand(cmd_name, cmd_details, app_instance_names))
 
         # sort list of commands in name order
         menu_items.sort(key=lambda x: x.name)
 
-        # now add favourites
+        # now add favourites, looked up by (app instance name, command name)
+        commands_by_key = dict((cmd.get_key(), cmd) for cmd in menu_items)
         for fav in self.engine.get_setting("menu_favourites"):
-            app_instance_name = fav["app_instance"]
-            menu_name = fav["name"]
-
-            # scan through all menu items
-            for cmd in menu_items:
-                 if cmd.get_app_instance_name() == app_instance_name and cmd.name == menu_name:
-                     # found our match!
-                     cmd.add_command_to_menu(menu_handle)
-                     # mark as a favourite item
-                     cmd.favourite = True
+            cmd = commands_by_key.get((fav["app_instance"], fav["name"]))
+            if cmd is not None:
+                root_actions.append(self._get_command_action(self.root_menu, ROOT_MENU, cmd))
+                # mark as a favourite item
+                cmd.favourite = True
 
-        menu_handle.addSeparator()
+        root_actions.append(self._state.separator(self.root_menu, ROOT_MENU, "favourites"))
 
         # now go through all of the menu items.
         # separate them out into various sections
+        context_cmds = []
         commands_by_app = {}
 
         for cmd in menu_items:
             if cmd.get_type() == "context_menu":
                 # context menu!
-                cmd.add_command_to_menu(self._context_menu)
+                context_cmds.append(cmd)
 
             else:
                 # normal menu
@@ -92,50 +136,96 @@ class MenuGenerator(object):
                     commands_by_app[app_name] = []
                 commands_by_app[app_name].append(cmd)
 
+        # the submenus are only populated when they are first shown
+        self._state.defer(self._context_menu, CONTEXT_MENU, lambda: self._populate_context_menu(context_cmds))
+
         # now add all apps to main menu
-        self._add_app_menu(commands_by_app, menu_handle)
+        root_actions.extend(self._add_app_menu(commands_by_app))
+        self._state.set_actions(self.root_menu, root_actions)
+
+        # drop the actions of the commands which are not registered anymore
+        self._state.end()
+
+    def _get_command_action(self, menu, menu_key, cmd):
+        """
+        Returns the action of an app command in a menu.
+        """
+        return self._state.action(
+            menu, menu_key, cmd.get_key(), cmd.name, cmd.callback, icon=cmd.properties.get("icon")
+        )
 
     @classmethod
     def get_or_create_root_menu(cls, menu_name):
         """
         Attempts to find an existing menu of the specified title. If it can't be
-        found, it creates one.
+        found, it creates one. The menu is cached until it is destroyed.
         """
+        menu_ref = cls._root_menus.get(menu_name)
+        menu = menu_ref() if menu_ref is not None else None
+        if menu is not None:
+            return menu
+
         # Get the "main menu" (the bar of menus)
         main_menu = cls.__get_katana_main_menu()
         if not main_menu:
             return
 
         # Attempt to find existing menu
-        for menu in main_menu.children():
-            if type(menu).__name__ == "QMenu" and menu.title() == menu_name:
-                return menu
+        for child in main_menu.children():
+            if type(child).__name__ == "QMenu" and child.title() == menu_name:
+                menu = child
+                break
+        else:
+            # Otherwise, create a new menu
+            menu = QtGui.QMenu(menu_name, main_menu)
+            main_menu.addMenu(menu)
 
-        # Otherwise, create a new menu
-        menu = QtGui.QMenu(menu_name, main_menu)
-        main_menu.addMenu(menu)
+        cls._root_menus[menu_name] = _weak_widget_ref(menu, lambda: cls._root_menus.pop(menu_name, None))
         return menu
 
     @classmethod
     def __get_katana_main_menu(cls):
+        main_menu = cls._main_menu() if cls._main_menu is not None else None
+        if main_menu is not None:
+            return main_menu
+
         layoutsMenus = [x for x in QtGui.qApp.topLevelWidgets() if type(x).__name__ == 'LayoutsMenu']
         if len(layoutsMenus) != 1:
             return
 
         mainMenu = layoutsMenus[0].parent()
+        if mainMenu is not None:
+            if not cls._main_menu_watched:
+                mainMenu.destroyed.connect(lambda *args: cls.__forget_katana_main_menu())
+                cls._main_menu_watched = True
+            cls._main_menu = weakref.ref(mainMenu)
         return mainMenu
 
+    @classmethod
+    def __forget_katana_main_menu(cls):
+        cls._main_menu = None
+        cls._main_menu_watched = False
+
     def destroy_menu(self):
         """
         Destroys the Shotgun menu.
         """
         if self.root_menu is not None:
-            self.root_menu.clear()
+            self.clear_root_menu(self.root_menu)
+
+    @classmethod
+    def clear_root_menu(cls, menu):
+        """
+        Removes all the actions of a root menu, e.g. to show the disabled or error menu instead, and forgets the
+        actions kept for the next update of the menu.
+        """
+        _MenuState.discard(menu)
+        menu.clear()
 
     ##########################################################################################
     # context menu and UI
 
-    def _add_context_menu(self, menu_handle):
+    def _add_context_menu(self):
         """
         Adds a context menu which displays the current context.
         """
@@ -143,17 +233,22 @@ class MenuGenerator(object):
         ctx_name = str(ctx)
 
         # create the menu object
-        ctx_menu = menu_handle.addMenu(ctx_name)
-
-        action = QtGui.QAction('Jump to Shotgun', self.root_menu, triggered=self._jump_to_sg)
-        ctx_menu.addAction(action)
+        return self._state.submenu(self.root_menu, CONTEXT_MENU, ctx_name)
 
-        action = QtGui.QAction('Jump to File System', self.root_menu, triggered=self._jump_to_fs)
-        ctx_menu.addAction(action)
-
-        ctx_menu.addSeparator()
-
-        return ctx_menu
+    def _populate_context_menu(self, cmds):
+        """
+        Populates the context menu with the jump actions and the context menu commands.
+        """
+        actions = [
+            self._state.action(self._context_menu, CONTEXT_MENU, "jump_to_sg", 'Jump to Shotgun', self._jump_to_sg),
+            self._state.action(
+                self._context_menu, CONTEXT_MENU, "jump_to_fs", 'Jump to File System', self._jump_to_fs
+            ),
+            self._state.separator(self._context_menu, CONTEXT_MENU, "jump"),
+        ]
+        for cmd in cmds:
+            actions.append(self._get_command_action(self._context_menu, CONTEXT_MENU, cmd))
+        self._state.populate(self._context_menu, CONTEXT_MENU, actions)
 
     def _jump_to_sg(self):
         """
@@ -174,40 +269,67 @@ class MenuGenerator(object):
             system = sys.platform
 
             # run the app
-            if system == "linux2":
-                cmd = 'xdg-open "%s"' % disk_location
+            if system == "win32":
+                # the shell opens the folder without a console and returns right away
+                try:
+                    os.startfile(disk_location)
+                except OSError, e:
+                    self.engine.log_error("Failed to open '%s': %s" % (disk_location, e))
+                continue
+            elif system.startswith("linux"):
+                cmd = ["xdg-open", disk_location]
             elif system == "darwin":
-                cmd = 'open "%s"' % disk_location
-            elif system == "win32":
-                cmd = 'cmd.exe /C start "Folder" "%s"' % disk_location
+                cmd = ["open", disk_location]
             else:
-                raise Exception("Platform '%s' is not supported." % system)
-
-            exit_code = os.system(cmd)
-            if exit_code != 0:
-                self.engine.log_error("Failed to launch '%s'!" % cmd)
+                self.engine.log_error("Platform '%s' is not supported." % system)
+                return
+
+            # don't block the UI until the file browser returns, it is waited for in the background
+            try:
+                process = subprocess.Popen(cmd)
+            except OSError, e:
+                self.engine.log_error("Failed to launch '%s': %s" % (" ".join(cmd), e))
+                continue
+            thread = threading.Thread(
+                target=self._wait_for_process, args=(process, cmd), name="tk-katana jump to file system"
+            )
+            thread.daemon = True
+            thread.start()
+
+    def _wait_for_process(self, process, cmd):
+        """
+        Waits for a process launched by _jump_to_fs, and reports its failure.
+        """
+        exit_code = process.wait()
+        if exit_code != 0:
+            self.engine.log_error("Failed to launch '%s'!" % " ".join(cmd))
 
     ##########################################################################################
     # app menus
 
-    def _add_app_menu(self, commands_by_app, menu_handle):
+    def _add_app_menu(self, commands_by_app):
         """
         Add all apps to the main menu, process them one by one.
+        Returns the actions to add to the main menu.
         """
+        actions = []
         for app_name in sorted(commands_by_app.keys()):
 
             if len(commands_by_app[app_name]) > 1:
                 # more than one menu entry fort his app
                 # make a sub menu and put all items in the sub menu
-                app_menu = menu_handle.addMenu(app_name)
+                menu_key = ("app", app_name)
+                app_menu = self._state.submenu(self.root_menu, menu_key, app_name)
 
                 # get the list of menu cmds for this app
                 cmds = commands_by_app[app_name]
                 # make sure it is in alphabetical order
                 cmds.sort(key=lambda x: x.name)
 
-                for cmd in cmds:
-                    cmd.add_command_to_menu(app_menu)
+                self._state.defer(
+                    app_menu, menu_key, lambda m=app_menu, k=menu_key, c=cmds: self._populate_app_menu(m, k, c)
+                )
+                actions.append(app_menu.menuAction())
 
             else:
                 # this app only has a single entry.
@@ -217,7 +339,185 @@ class MenuGenerator(object):
                 cmd_obj = commands_by_app[app_name][0]
                 if not cmd_obj.favourite:
                     # skip favourites since they are alreay on the menu
-                    cmd_obj.add_command_to_menu(menu_handle)
+                    actions.append(self._get_command_action(self.root_menu, ROOT_MENU, cmd_obj))
+        return actions
+
+    def _populate_app_menu(self, app_menu, menu_key, cmds):
+        """
+        Populates the submenu of an app with its commands.
+        """
+        self._state.populate(app_menu, menu_key, [self._get_command_action(app_menu, menu_key, cmd) for cmd in cmds])
+
+
+class _CommandSlot(object):
+    """
+    The slot of the action of a command, calling the command's current callback. The callback is swapped when the
+    menu is updated, so that the QAction can be kept.
+
+    From the PyQt documentation:
+    PySide.QtGui.QAction.triggered([checked = false])
+    Parameters:    checked - PySide.QtCore.bool
+    If your callback signature is cmd(*args), the signal sent will have an arg, False, which corresponds
+    to the checked state of the menu item. But if it's cmd(), then it won't.
+    since the apps registered commands are defined as wrappers, callback_wrapper(*args, **kwargs)
+     (see /rdo/rodeo/repositories/tank/studio/install/core/python/tank/platform/engine.py,
+    register_command function), they would pass the False argument to the callbacks registered by the
+    apps, for example for tk-multi-contextSwitcher:
+    menu_callback = lambda : app_payload.contextSwitcher.show_dialog(self)
+    this would fail since the callback does not take any arguments, so the callback is called without any.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, *args):
+        self.callback()
+
+
+class _MenuState(object):
+    """
+    The actions and submenus created by the menu generators in a root menu, kept across the engine instances so
+    that the menu is updated in place on context switches rather than rebuilt. The state is stored on the root
+    menu widget, which keeps it alive since the menu is owned by Katana's main menu bar.
+
+    Actions are keyed by menu key (see ROOT_MENU) and entry key, e.g. (app instance name, command name) for the
+    commands. A menu update starts with begin, gets the actions of each menu with action, separator and
+    submenu, sets them in order with set_actions, and ends with end, which deletes the actions not used anymore.
+    Submenus are rather populated on their first aboutToShow signal, see defer, so that the startup only pays for
+    the root menu.
+    """
+    _ATTRIBUTE = "_tk_katana_menu_state"
+
+    def __init__(self):
+        self._actions = {}
+        self._slots = {}
+        self._icons = {}
+        self._submenus = {}
+        self._pending = {}
+        self._used = set()
+
+    @classmethod
+    def get(cls, root_menu):
+        """
+        Returns the state of a root menu, clearing the menu if it has none.
+        """
+        state = getattr(root_menu, cls._ATTRIBUTE, None)
+        if state is None:
+            # the menu may hold the disabled or error menu
+            root_menu.clear()
+            state = cls()
+            setattr(root_menu, cls._ATTRIBUTE, state)
+        return state
+
+    @classmethod
+    def discard(cls, root_menu):
+        """
+        Forgets the state of a root menu, before its actions are cleared.
+        """
+        state = getattr(root_menu, cls._ATTRIBUTE, None)
+        if state is not None:
+            for submenu in state._submenus.values():
+                submenu.deleteLater()
+            setattr(root_menu, cls._ATTRIBUTE, None)
+
+    def begin(self):
+        self._used = set()
+
+    def action(self, menu, menu_key, key, label, callback, icon=None):
+        """
+        Returns the action of an entry of a menu, created if needed, with the given label, callback and icon.
+        """
+        full_key = (menu_key, key)
+        self._used.add(full_key)
+        action = self._actions.get(full_key)
+        if action is None:
+            slot = _CommandSlot(callback)
+            action = QtGui.QAction(label, menu, triggered=slot)
+            self._actions[full_key] = action
+            self._slots[full_key] = slot
+        else:
+            self._slots[full_key].callback = callback
+            if action.text() != label:
+                action.setText(label)
+        if self._icons.get(full_key) != icon:
+            action.setIcon(get_icon(icon) if icon else QtGui.QIcon())
+            self._icons[full_key] = icon
+        return action
+
+    def separator(self, menu, menu_key, key):
+        """
+        Returns a separator of a menu, created if needed.
+        """
+        full_key = (menu_key, ("separator", key))
+        self._used.add(full_key)
+        action = self._actions.get(full_key)
+        if action is None:
+            action = QtGui.QAction(menu)
+            action.setSeparator(True)
+            self._actions[full_key] = action
+        return action
+
+    def submenu(self, parent_menu, menu_key, title):
+        """
+        Returns a submenu, created if needed, with the given title. Its menuAction has to be set in the parent menu.
+        """
+        self._used.add(menu_key)
+        menu = self._submenus.get(menu_key)
+        if menu is None:
+            menu = QtGui.QMenu(title, parent_menu)
+            menu.aboutToShow.connect(lambda: self._populate_pending(menu_key))
+            self._submenus[menu_key] = menu
+        elif menu.title() != title:
+            menu.setTitle(title)
+        return menu
+
+    def set_actions(self, menu, actions):
+        """
+        Sets the actions of a menu, in order. The menu is left untouched if they did not change.
+        """
+        if menu.actions() == actions:
+            return
+        for action in menu.actions():
+            menu.removeAction(action)
+        menu.addActions(actions)
+
+    def defer(self, menu, menu_key, populate):
+        """
+        Defers the population of a submenu until it is about to be shown. Replaces the population deferred by a
+        previous update, the actions of the submenu are kept until then.
+
+        :param populate: A function populating the menu with populate.
+        """
+        self._pending[menu_key] = populate
+
+    def _populate_pending(self, menu_key):
+        populate = self._pending.pop(menu_key, None)
+        if populate is not None:
+            populate()
+
+    def populate(self, menu, menu_key, actions):
+        """
+        Sets the actions of a submenu whose population was deferred, and deletes the ones it does not hold anymore.
+        """
+        self.set_actions(menu, actions)
+        for full_key in [k for k in self._actions if k[0] == menu_key and self._actions[k] not in actions]:
+            self._actions.pop(full_key).deleteLater()
+            self._slots.pop(full_key, None)
+            self._icons.pop(full_key, None)
+
+    def end(self):
+        """
+        Deletes the actions and the submenus not used since begin, except the actions of the submenus whose
+        population is deferred.
+        """
+        for menu_key in [k for k in self._pending if k not in self._used]:
+            del self._pending[menu_key]
+        for full_key in [k for k in self._actions if k not in self._used and k[0] not in self._pending]:
+            self._actions.pop(full_key).deleteLater()
+            self._slots.pop(full_key, None)
+            self._icons.pop(full_key, None)
+        for menu_key in [k for k in self._submenus if k not in self._used]:
+            self._submenus.pop(menu_key).deleteLater()
 
 
 class AppCommand(object):
@@ -225,11 +525,18 @@ class AppCommand(object):
     Wraps around a single command that you get from engine.commands
     """
 
-    def __init__(self, name, command_dict):
+    def __init__(self, name, command_dict, app_instance_names=None):
+        """
+        :param name: The name of the command.
+        :param command_dict: The properties and the callback of the command, from engine.commands.
+        :param app_instance_names: The app instance names keyed by app, used instead of scanning the apps of the
+                                   engine in get_app_instance_name.
+        """
         self.name = name
         self.properties = command_dict["properties"]
         self.callback = command_dict["callback"]
         self.favourite = False
+        self._app_instance_names = app_instance_names
 
     def get_app_name(self):
         """
@@ -248,6 +555,9 @@ class AppCommand(object):
             return None
 
         app_instance = self.properties["app"]
+        if self._app_instance_names is not None:
+            return self._app_instance_names.get(app_instance)
+
         engine = app_instance.engine
 
         for (app_instance_name, app_instance_obj) in engine.apps.items():
@@ -277,38 +587,8 @@ class AppCommand(object):
         """
         return self.properties.get("type", "default")
 
-    def do_add_command(self, menu, name, cmd, hot_key=None, icon=None):
-        # TODO add hot key
-
-        # From the PyQt documentation:
-        # PySide.QtGui.QAction.triggered([checked = false])
-        # Parameters:    checked – PySide.QtCore.bool
-        # If your callback signature is cmd(*args), the signal sent will have an arg, False, which corresponds
-        # to the checked state of the menu item. But if it's cmd(), then it won't.
-        # since the apps registered commands are defined as wrappers, callback_wrapper(*args, **kwargs)
-        #  (see /rdo/rodeo/repositories/tank/studio/install/core/python/tank/platform/engine.py,
-        # register_command function), they will pass the False argument to the callbacks registered by the
-        # apps, for example for tk-multi-contextSwitcher:
-        # menu_callback = lambda : app_payload.contextSwitcher.show_dialog(self)
-        # this will fail since the callback does not take any arguments.
-        # By "wrapping the wrapper" with this lambda, the function attached to triggered has no args and
-        # everything works.
-        cb = lambda: cmd()
-        if hot_key:
-            action = QtGui.QAction(name, menu, triggered=cb, icon=icon)
-        else:
-            if icon:
-                new_icon = QtGui.QIcon(icon)
-                action = QtGui.QAction(name, menu, triggered=cb, icon=new_icon)
-            else:
-                action = QtGui.QAction(name, menu, triggered=cb)
-        menu.addAction(action)
-
-    def add_command_to_menu(self, menu):
+    def get_key(self):
         """
-        Adds an app command to the menu.
+        Returns the key identifying the command across the engine instances: its app instance name and its name.
         """
-        # std shotgun menu
-        icon = self.properties.get("icon")
-        hotkey = self.properties.get("hotkey")
-        self.do_add_command(menu,self.name, self.callback, hot_key=hotkey, icon=icon)
+        return (self.get_app_instance_name(), self.name)
@@ -0,0 +1,189 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Background prefetch of the Shotgun data the engine needs at startup.
+
+The Katana init script starts the prefetch as soon as the context is
+deserialized, and the engine consumes the results while validating its
+context, so that the Shotgun queries run in parallel with the rest of the
+startup instead of one after the other on Katana's main thread.
+
+A standalone module, see standalone.py.
+"""
+import sys
+import time
+import getpass
+import threading
+
+
+# Number of seconds to wait for a prefetch before querying Shotgun directly
+RESULT_TIMEOUT = 30
+
+# Fields of the candidate tasks needed to choose the task to work on
+TASK_FIELDS = ["task_assignees", "step.Step.short_name", "sg_status_list"]
+
+# The prefetch started by the init script, until the engine takes it
+_current_prefetch = None
+
+
+class PrefetchTimeout(Exception):
+    """
+    Raised when a prefetch did not complete in time.
+    """
+
+
+class Future(object):
+    """
+    The result of a function called in a background thread.
+    """
+
+    def __init__(self, name, func, *args):
+        """
+        :param name: The name of the prefetched data, used in the timing report.
+        :param func: The function to call in the background.
+        :param args: The arguments to call the function with.
+        """
+        self.name = name
+        self.duration = None
+        self.wait_duration = 0.0
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+        thread = threading.Thread(target=self._run, args=(func, args), name="tk-katana prefetch %s" % name)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, func, args):
+        start_time = time.time()
+        try:
+            self._result = func(*args)
+        except Exception, e:
+            self._error = e
+        self.duration = time.time() - start_time
+        self._done.set()
+
+    def done(self):
+        """
+        Returns whether the function has returned.
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=RESULT_TIMEOUT):
+        """
+        Waits for the function to return and returns its result, or raises the
+        exception it raised.
+
+        :raises PrefetchTimeout: If the function did not return in time.
+        """
+        start_time = time.time()
+        done = self._done.wait(timeout)
+        self.wait_duration += time.time() - start_time
+        if not done:
+            raise PrefetchTimeout("Prefetch of %s did not complete in %ss" % (self.name, timeout))
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def _get_connection(tk):
+    """
+    Returns a Shotgun connection for the calling thread. Shotgun connections
+    are not thread safe, so each prefetch thread needs its own. The
+    connection is instrumented so that the prefetch queries are counted.
+    """
+    try:
+        from tank.util import shotgun
+        sg = shotgun.create_sg_connection()
+    except (ImportError, AttributeError, TypeError):
+        # Cores giving each thread its own connection
+        sg = tk.shotgun
+    shotgun_stats = sys.modules["tk_katana_standalone"].import_engine_module("shotgun_stats")
+    return shotgun_stats.get_stats().instrument(sg)
+
+
+def _find_tasks(tk, project, entity):
+    return _get_connection(tk).find(
+        "Task", [["project", "is", project], ["entity", "is", entity]], TASK_FIELDS
+    )
+
+
+def _find_current_user(tk, login):
+    return _get_connection(tk).find_one("HumanUser", [["login", "is", login]], ["login"])
+
+
+def _same_entity(entity, other):
+    if not entity or not other:
+        return False
+    return entity["type"] == other["type"] and entity["id"] == other["id"]
+
+
+class StartupPrefetch(object):
+    """
+    Fetches in parallel the candidate tasks of an entity context (in all
+    steps) and the HumanUser of the current user.
+    """
+
+    def __init__(self, tk, context):
+        self.project = context.project
+        self.entity = context.entity
+        self.login = getpass.getuser()
+        self.start_time = time.time()
+        self.tasks = Future("tasks", _find_tasks, tk, context.project, context.entity)
+        self.current_user = Future("current user", _find_current_user, tk, self.login)
+
+    def matches(self, context):
+        """
+        Returns whether the prefetched data is the one of the given context.
+        """
+        return (
+            _same_entity(context.project, self.project)
+            and _same_entity(context.entity, self.entity)
+            and not context.task
+        )
+
+    def report(self):
+        """
+        Returns a one line report of the time spent fetching each piece of
+        data and waiting for it. The difference between the two is the time
+        the prefetch took off the main thread.
+        """
+        parts = []
+        saved = 0.0
+        for future in (self.tasks, self.current_user):
+            if future.duration is None:
+                parts.append("%s: pending" % future.name)
+            else:
+                parts.append("%s: fetched in %.3fs, waited %.3fs" % (
+                    future.name, future.duration, future.wait_duration
+                ))
+                saved += future.duration - future.wait_duration
+        return "Startup prefetch saved %.3fs (%s)" % (saved, ", ".join(parts))
+
+
+def start(tk, context):
+    """
+    Starts prefetching the data of the given context, if it is an entity
+    context without a task.
+
+    :returns: The StartupPrefetch, or None if nothing needs prefetching.
+    """
+    global _current_prefetch
+    if not context.project or not context.entity or context.task:
+        return None
+    _current_prefetch = StartupPrefetch(tk, context)
+    return _current_prefetch
+
+
+def take(context):
+    """
+    Returns the prefetch started for the given context and forgets it, or
+    None if there is none.
+    """
+    global _current_prefetch
+    prefetch = _current_prefetch
+    if prefetch is None or not prefetch.matches(context):
+        return None
+    _current_prefetch = None
+    return prefetch
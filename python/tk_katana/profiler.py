@@ -0,0 +1,231 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Instrumentation of the Katana engine startup.
+
+Setting the TK_KATANA_PROFILE_STARTUP environment variable enables it: the
+duration of each startup phase, of the initialization of each app and of the
+Shotgun calls made meanwhile are recorded and emitted as a JSON report once
+the startup is complete. If the variable holds a path rather than "1", the
+report is also written to that file.
+
+A standalone module, see standalone.py.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+
+# Environment variable enabling the startup profiling
+ENV_VAR = "TK_KATANA_PROFILE_STARTUP"
+
+# Values of ENV_VAR which enable the profiling without writing the report to a file
+_ENABLED_VALUES = ("1", "true", "yes", "on")
+
+# Python 2 has no monotonic clock
+_clock = getattr(time, "monotonic", time.time)
+
+# The profiler of the current startup, see get_profiler
+_profiler = None
+
+
+class StartupProfiler(object):
+    """
+    Records the startup phases and the Shotgun calls, and emits the report
+    once all the expected milestones are reached.
+    """
+    enabled = True
+
+    def __init__(self, output_path, milestones):
+        """
+        :param output_path: The path of the file to write the report to, or None.
+        :param milestones: The names of the milestones marking the end of the
+                           startup, see finish.
+        """
+        self.output_path = output_path
+        self._pending_milestones = set(milestones)
+        self._start_time = _clock()
+        self._phases = []
+        self._open_phases = {}
+        self._shotgun_calls = {}
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def start_phase(self, name):
+        """
+        Marks the start of a phase, see end_phase.
+        """
+        self._open_phases[name] = _clock()
+
+    def end_phase(self, name):
+        """
+        Marks the end of a phase started with start_phase.
+        """
+        start_time = self._open_phases.pop(name, None)
+        if start_time is not None:
+            self._record_phase(name, start_time, _clock())
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        A context manager timing the phase it wraps.
+        """
+        start_time = _clock()
+        try:
+            yield
+        finally:
+            self._record_phase(name, start_time, _clock())
+
+    def _record_phase(self, name, start_time, end_time):
+        with self._lock:
+            self._phases.append({
+                "name": name,
+                "start": round(start_time - self._start_time, 6),
+                "duration": round(end_time - start_time, 6),
+                "thread": threading.current_thread().name,
+            })
+
+    def record_shotgun_call(self, method, duration):
+        """
+        Records a call to a method of a Shotgun connection. Registered by the
+        engine as a listener of the Shotgun call statistics, see
+        shotgun_stats.ShotgunStats.add_listener.
+        """
+        with self._lock:
+            calls = self._shotgun_calls.setdefault(method, {"count": 0, "total": 0.0, "max": 0.0})
+            calls["count"] += 1
+            calls["total"] += duration
+            calls["max"] = max(calls["max"], duration)
+
+    def instrument_app_loading(self):
+        """
+        Times the creation and the initialization of each app loaded by the
+        engine, by wrapping tank.platform.application.get_application.
+
+        :returns: A function restoring the original get_application.
+        """
+        from tank.platform import application
+
+        get_application = application.get_application
+        profiler = self
+
+        def timed_get_application(*args, **kwargs):
+            start_time = _clock()
+            app = get_application(*args, **kwargs)
+            name = getattr(app, "instance_name", None) or app.__class__.__name__
+            profiler._record_phase("app:%s:create" % name, start_time, _clock())
+
+            init_app = app.init_app
+
+            def timed_init_app(*init_args, **init_kwargs):
+                with profiler.phase("app:%s:init" % name):
+                    return init_app(*init_args, **init_kwargs)
+            app.init_app = timed_init_app
+            return app
+
+        application.get_application = timed_get_application
+
+        def restore():
+            application.get_application = get_application
+        return restore
+
+    def report(self):
+        """
+        Returns the report as a dict.
+        """
+        with self._lock:
+            shotgun_calls = dict((k, dict(v)) for (k, v) in self._shotgun_calls.items())
+            phases = sorted(self._phases, key=lambda p: p["start"])
+        for calls in shotgun_calls.values():
+            calls["total"] = round(calls["total"], 6)
+            calls["max"] = round(calls["max"], 6)
+        return {
+            "total": round(_clock() - self._start_time, 6),
+            "phases": phases,
+            "shotgun": {
+                "calls": sum(c["count"] for c in shotgun_calls.values()),
+                "latency": round(sum(c["total"] for c in shotgun_calls.values()), 6),
+                "methods": shotgun_calls,
+            },
+        }
+
+    def finish(self, milestone):
+        """
+        Marks a milestone of the end of the startup as reached. Once all the
+        milestones are reached, the report is printed and written to the
+        output file if there is one.
+        """
+        with self._lock:
+            self._pending_milestones.discard(milestone)
+            if self._pending_milestones or self._reported:
+                return
+            self._reported = True
+
+        report = json.dumps(self.report(), sort_keys=True)
+        logger = sys.modules["tk_katana_standalone"].get_logger()
+        logger.info("Startup Profile: %s" % report)
+        if self.output_path:
+            try:
+                with open(self.output_path, "w") as output_file:
+                    output_file.write(report)
+            except (IOError, OSError), e:
+                logger.warning("Startup Profile: Could not write %s: %s" % (self.output_path, e))
+
+
+class _DisabledProfiler(object):
+    """
+    Stands for the profiler when profiling is disabled, doing nothing.
+    """
+    enabled = False
+
+    def start_phase(self, name):
+        pass
+
+    def end_phase(self, name):
+        pass
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        yield
+
+    def instrument_app_loading(self):
+        return lambda: None
+
+    def finish(self, milestone):
+        pass
+
+
+def start(milestones):
+    """
+    Starts profiling the startup if TK_KATANA_PROFILE_STARTUP is set.
+
+    :param milestones: The names of the milestones marking the end of the
+                       startup, see StartupProfiler.finish.
+    :returns: The profiler.
+    """
+    global _profiler
+    value = os.environ.get(ENV_VAR)
+    if not value or value.lower() in ("0", "false", "no", "off"):
+        _profiler = _DisabledProfiler()
+    else:
+        output_path = None if value.lower() in _ENABLED_VALUES else value
+        _profiler = StartupProfiler(output_path, milestones)
+        # record the Shotgun calls from now on, including the prefetch queries started before the engine
+        shotgun_stats = sys.modules["tk_katana_standalone"].import_engine_module("shotgun_stats")
+        shotgun_stats.get_stats().add_listener(_profiler.record_shotgun_call)
+    return _profiler
+
+
+def get_profiler():
+    """
+    Returns the profiler of the current startup, which does nothing if the
+    profiling is disabled or was not started.
+    """
+    if _profiler is None:
+        return _DisabledProfiler()
+    return _profiler
@@ -0,0 +1,237 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Accounting of the Shotgun API calls made by the Katana session.
+
+The engine instruments the Shotgun connection of its Tank instance, which the
+apps and the hooks share, and so do the startup prefetch and the asset plug-in
+for their own connections. Each call is counted per method and entity type,
+with its latency in a histogram. The statistics are process-wide, so they
+cover all the engine instances created on file opens.
+They can be dumped from the context menu or, by setting the
+TK_KATANA_SHOTGUN_STATS environment variable to a path, written to that file
+as JSON when Katana exits, e.g. for farm renders.
+
+A standalone module, see standalone.py.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+
+# Environment variable holding the path of the file to write the statistics to at exit
+ENV_VAR = "TK_KATANA_SHOTGUN_STATS"
+
+# Methods of the Shotgun connection which talk to the server
+SHOTGUN_METHODS = (
+    "find", "find_one", "create", "update", "delete", "revive", "batch", "summarize",
+    "upload", "upload_thumbnail", "download_attachment", "schema_read", "schema_field_read",
+    "schema_entity_read", "text_search", "info",
+)
+
+# Methods whose first argument is an entity type
+_ENTITY_TYPE_METHODS = frozenset((
+    "find", "find_one", "create", "update", "delete", "revive", "summarize", "upload",
+    "upload_thumbnail", "schema_field_read",
+))
+
+# Upper bounds of the latency histogram buckets, in seconds. A last bucket holds the slower calls.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Python 2 has no monotonic clock
+_clock = getattr(time, "monotonic", time.time)
+
+# The statistics of the process, see get_stats
+_stats = None
+_stats_lock = threading.Lock()
+
+
+class _CallStats(object):
+    """
+    The statistics of the calls of one method on one entity type.
+    """
+    __slots__ = ("count", "errors", "total", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, duration, failed):
+        self.count += 1
+        if failed:
+            self.errors += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        for (index, bound) in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.histogram[index] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def as_dict(self):
+        labels = ["<=%gs" % bound for bound in LATENCY_BUCKETS] + [">%gs" % LATENCY_BUCKETS[-1]]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class ShotgunStats(object):
+    """
+    Counts the calls made on instrumented Shotgun connections and notifies
+    the listeners of each call, see add_listener.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+
+    def add_listener(self, listener):
+        """
+        Adds a function called with the method and the duration of each call.
+        A listener is only added once.
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def record(self, method, entity_type, duration, failed=False):
+        """
+        Records a call to a method of a Shotgun connection.
+        """
+        with self._lock:
+            key = (method, entity_type)
+            calls = self._calls.get(key)
+            if calls is None:
+                calls = self._calls[key] = _CallStats()
+            calls.add(duration, failed)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(method, duration)
+
+    def instrument(self, sg):
+        """
+        Wraps the methods of a Shotgun connection, in place, to record their
+        calls. A connection is only instrumented once.
+        """
+        if getattr(sg, "_tk_katana_instrumented", False):
+            return sg
+        for method in SHOTGUN_METHODS:
+            func = getattr(sg, method, None)
+            if func is not None:
+                setattr(sg, method, self._wrap(method, func))
+        sg._tk_katana_instrumented = True
+        return sg
+
+    def _wrap(self, method, func):
+        with_entity_type = method in _ENTITY_TYPE_METHODS
+
+        def recorded(*args, **kwargs):
+            entity_type = args[0] if with_entity_type and args else kwargs.get("entity_type")
+            failed = True
+            start_time = _clock()
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.record(method, entity_type, _clock() - start_time, failed)
+        recorded.__name__ = method
+        recorded.__doc__ = func.__doc__
+        return recorded
+
+    def reset(self):
+        """
+        Forgets the recorded calls.
+        """
+        with self._lock:
+            self._calls = {}
+            self._start_time = time.time()
+
+    def report(self):
+        """
+        Returns the statistics as a dict: the totals, and the statistics of
+        each method per entity type.
+        """
+        with self._lock:
+            calls = dict((key, stats.as_dict()) for (key, stats) in self._calls.items())
+            start_time = self._start_time
+        methods = {}
+        for ((method, entity_type), stats) in calls.items():
+            methods.setdefault(method, {})[entity_type or "-"] = stats
+        return {
+            "since": start_time,
+            "calls": sum(s["count"] for s in calls.values()),
+            "errors": sum(s["errors"] for s in calls.values()),
+            "latency": round(sum(s["total"] for s in calls.values()), 6),
+            "methods": methods,
+        }
+
+    def format_report(self):
+        """
+        Returns the statistics as a table, one line per method and entity
+        type, the slowest first.
+        """
+        report = self.report()
+        rows = []
+        for (method, entity_types) in report["methods"].items():
+            for (entity_type, stats) in entity_types.items():
+                rows.append((stats["total"], method, entity_type, stats))
+        rows.sort(reverse=True)
+
+        lines = ["%d Shotgun calls in %.3fs, %d failed" % (report["calls"], report["latency"], report["errors"])]
+        for (total, method, entity_type, stats) in rows:
+            lines.append("  %-20s %-24s %6d calls %9.3fs total %7.3fs mean %7.3fs max" % (
+                method, entity_type, stats["count"], total, stats["mean"], stats["max"]
+            ))
+        return "\n".join(lines)
+
+    def write(self, path):
+        """
+        Writes the statistics to a JSON file.
+        """
+        with open(path, "w") as stats_file:
+            json.dump(self.report(), stats_file, sort_keys=True, indent=2)
+
+
+def _write_at_exit(stats, path):
+    try:
+        stats.write(path)
+    except (IOError, OSError), e:
+        sys.modules["tk_katana_standalone"].get_logger().warning(
+            "Could not write the Shotgun call statistics to %s: %s" % (path, e)
+        )
+
+
+def get_stats():
+    """
+    Returns the Shotgun call statistics of the process.
+    """
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = ShotgunStats()
+            path = os.environ.get(ENV_VAR)
+            if path:
+                atexit.register(_write_at_exit, _stats, path)
+    return _stats
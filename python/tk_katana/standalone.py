@@ -0,0 +1,46 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Loader of the standalone modules of the engine: the modules of this folder
+used before the engine is initialized, by the Katana init script and by the
+engine itself (task_cache, prefetch, profiler, log_backend, shotgun_stats and
+tank_pool).
+
+They are loaded on their own rather than through the tk_katana package, which
+imports Katana's UI and can only be imported once the engine is initialized.
+Standalone modules must therefore not import Katana or anything from the
+tk_katana package, nor each other other than through import_engine_module.
+
+Modules are registered in sys.modules under stable names, so that the init
+script and all the engine instances of the process share their state. This
+module itself is loaded as "tk_katana_standalone" by the init script and by
+the engine.
+"""
+import os
+import imp
+import sys
+
+
+def import_engine_module(name):
+    """
+    Imports a standalone module of the engine.
+
+    :param name: The name of the module, e.g. "task_cache".
+    :returns: The module.
+    """
+    module_name = "tk_katana_%s" % name
+    module = sys.modules.get(module_name)
+    if module is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "%s.py" % name)
+        module = imp.load_source(module_name, path)
+    return module
+
+
+def get_logger():
+    """
+    Returns the logger of the engine, for the standalone modules which report
+    outside of the engine's log methods.
+    """
+    return import_engine_module("log_backend").get_logger()
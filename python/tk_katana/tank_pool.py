@@ -0,0 +1,148 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Process-wide pool of the Tank instances used by the Katana session.
+
+The engine is recreated on each file open and the hooks used to create their
+own Tank instances, each reading the pipeline configuration again and opening
+a new Shotgun connection. The pool keeps one Tank instance per pipeline
+configuration, along with its authenticated Shotgun connection, and hands it
+out to the engine instances and the hooks.
+
+A standalone module, see standalone.py.
+"""
+import os
+import threading
+
+
+# The pool of the process, see get_pool
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _normalize_path(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+class TankPool(object):
+    """
+    Tank instances keyed by the path of their pipeline configuration.
+    """
+
+    def __init__(self):
+        self._tanks = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            # Tank instances created by the pool
+            "tanks_created": 0,
+            # Tank instances created elsewhere, e.g. by the init script, and added to the pool
+            "tanks_registered": 0,
+            # Requests served with a pooled Tank instance
+            "tanks_reused": 0,
+        }
+
+    @staticmethod
+    def get_key(tk):
+        """
+        Returns the key of a Tank instance in the pool: the path of its pipeline configuration.
+        """
+        return _normalize_path(tk.pipeline_configuration.get_path())
+
+    def get(self, tk):
+        """
+        Returns the pooled Tank instance of the pipeline configuration of the
+        given one, or adds the given one to the pool if there is none.
+
+        :param tk: A Tank instance, e.g. the one of a context.
+        :rtype: :class:`tank.api.Tank`
+        """
+        key = self.get_key(tk)
+        with self._lock:
+            pooled = self._tanks.get(key)
+            if pooled is not None:
+                if pooled is not tk:
+                    self._stats["tanks_reused"] += 1
+                return pooled
+            self._tanks[key] = tk
+            self._stats["tanks_registered"] += 1
+            return tk
+
+    def tank_from_path(self, path):
+        """
+        Returns the pooled Tank instance of a project whose storage roots
+        contain the given path. Falls back to sgtk.tank_from_path, whose
+        result is added to the pool.
+
+        :param path: A path in a project, or the path of a pipeline configuration.
+        :rtype: :class:`tank.api.Tank`
+        """
+        norm_path = _normalize_path(path)
+        with self._lock:
+            for tk in self._tanks.values():
+                if self._contains(tk, norm_path):
+                    self._stats["tanks_reused"] += 1
+                    return tk
+
+        import sgtk
+        tk = sgtk.tank_from_path(path)
+        key = self.get_key(tk)
+        with self._lock:
+            # another thread may have created it meanwhile
+            pooled = self._tanks.get(key)
+            if pooled is not None:
+                self._stats["tanks_reused"] += 1
+                return pooled
+            self._tanks[key] = tk
+            self._stats["tanks_created"] += 1
+            return tk
+
+    def _contains(self, tk, norm_path):
+        """
+        Returns whether a normalized path is in the pipeline configuration or
+        the storage roots of a Tank instance.
+        """
+        roots = [tk.pipeline_configuration.get_path()]
+        try:
+            roots.extend((tk.roots or {}).values())
+        except Exception:
+            # Cores without the roots property
+            pass
+        for root in roots:
+            if not root:
+                continue
+            norm_root = _normalize_path(root)
+            if norm_path == norm_root or norm_path.startswith(norm_root + os.sep):
+                return True
+        return False
+
+    def clear(self):
+        """
+        Forgets the pooled Tank instances, e.g. after the pipeline configuration was updated.
+        """
+        with self._lock:
+            self._tanks = {}
+
+    def stats(self):
+        """
+        Returns the number of Tank instances created, registered and reused,
+        and the number of pooled pipeline configurations.
+
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pipeline_configurations"] = len(self._tanks)
+        return stats
+
+
+def get_pool():
+    """
+    Returns the Tank pool of the process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TankPool()
+    return _pool
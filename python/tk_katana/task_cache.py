@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+On-disk cache of the task contexts resolved by the engine at startup.
+
+A standalone module, see standalone.py.
+"""
+import os
+import json
+import time
+import tempfile
+
+
+# Environment variable overriding the folder where the engine caches data
+CACHE_DIR_ENV_VAR = "TK_KATANA_CACHE_DIR"
+
+
+def get_cache_dir():
+    """
+    Returns the folder where the engine caches data across Katana sessions.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return cache_dir
+    return os.path.join(os.path.expanduser("~"), ".shotgun", "tk-katana")
+
+
+# Entities of a context stored in the cache
+CONTEXT_FIELDS = ("project", "entity", "step", "task", "user", "additional_entities")
+
+
+def get_task_context_key(context, step_short_names, login, site, pipeline_configuration):
+    """
+    Returns the cache key of the task context resolved for an entity context.
+
+    :param context: The entity context given to the engine.
+    :type context: :class:`tank.context.Context`
+    :param step_short_names: The short names of the steps the task was looked up in.
+    :param login: The login of the current user.
+    :param site: The URL of the Shotgun site.
+    :param pipeline_configuration: The path of the pipeline configuration the engine runs on.
+    :rtype: str
+    """
+    return "%s:%s:%s:%s:%s:%s:%s" % (
+        site,
+        pipeline_configuration,
+        context.project["id"],
+        context.entity["type"],
+        context.entity["id"],
+        ",".join(step_short_names),
+        login,
+    )
+
+
+def get_context_fields(context):
+    """
+    Returns the entities of a context to store in the cache. Contexts are not
+    stored serialized, since deserializing them creates a new Tank instance
+    from the pipeline configuration recorded in them.
+
+    :type context: :class:`tank.context.Context`
+    :rtype: dict
+    """
+    fields = dict((name, getattr(context, name, None)) for name in CONTEXT_FIELDS)
+    fields["additional_entities"] = fields["additional_entities"] or []
+    return fields
+
+
+class TaskContextCache(object):
+    """
+    A JSON file mapping task context keys to the entities of task contexts, see
+    get_context_fields, with the time they were stored. Entries older than the time-to-live are ignored.
+    The file is replaced atomically, so concurrent Katana sessions can share it.
+    """
+
+    def __init__(self, path, ttl):
+        """
+        :param path: The path of the cache file.
+        :param ttl: The time-to-live of the entries, in seconds.
+        """
+        self._path = path
+        self._ttl = ttl
+
+    @property
+    def path(self):
+        """The path of the cache file."""
+        return self._path
+
+    def _read(self):
+        """
+        Returns the content of the cache file, or an empty dict if it can't be read.
+        """
+        try:
+            with open(self._path) as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def get(self, key):
+        """
+        Returns the context entities stored for the key, or None if there are
+        none, they have expired or they were stored in a former format.
+        """
+        entry = self._read().get(key)
+        if not entry or time.time() - entry.get("timestamp", 0) > self._ttl:
+            return None
+        fields = entry.get("context")
+        if not isinstance(fields, dict):
+            return None
+        return fields
+
+    def set(self, key, context_fields):
+        """
+        Stores the entities of a context for the key and drops the expired
+        entries. Failures to write the cache are ignored.
+        """
+        entries = self._read_valid()
+        entries[key] = {"context": context_fields, "timestamp": time.time()}
+        self._write(entries)
+
+    def delete(self, key):
+        """
+        Removes the context stored for the key, if any, and drops the expired
+        entries. Failures to write the cache are ignored.
+        """
+        entries = self._read_valid()
+        if entries.pop(key, None) is not None:
+            self._write(entries)
+
+    def _read_valid(self):
+        """
+        Returns the entries of the cache file which have not expired.
+        """
+        now = time.time()
+        return dict(
+            (k, entry) for (k, entry) in self._read().items()
+            if now - entry.get("timestamp", 0) <= self._ttl
+        )
+
+    def _write(self, entries):
+        """
+        Replaces the cache file with the given entries.
+        """
+        cache_dir = os.path.dirname(self._path)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            (fd, tmp_path) = tempfile.mkstemp(dir=cache_dir, prefix=".task_contexts")
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(entries, cache_file)
+            os.rename(tmp_path, self._path)
+        except (IOError, OSError):
+            pass
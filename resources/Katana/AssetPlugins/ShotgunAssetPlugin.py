@@ -1,8 +1,18 @@
 # Copyright (c) 2015 The Foundry Visionmongers Ltd. All Rights Reserved.
 
 from time import gmtime, strftime
+from collections import OrderedDict
+import ast
+import atexit
+import hashlib
+import imp
 import os
+import re
+import sqlite3
 import sys
+import threading
+import time
+import weakref
 import getpass
 import logging
 import AssetAPI
@@ -11,8 +21,631 @@ import AssetAPI
 import tank
 
 
+# Number of resolved asset IDs kept in memory when the engine does not
+# configure "asset_resolution_cache_size"
+DEFAULT_RESOLUTION_CACHE_SIZE = 10000
+
+# Number of parsed asset ID strings kept in memory
+ASSET_ID_CACHE_SIZE = 10000
+
+# Number of FileSequence objects kept in memory, keyed by resolved path
+FILE_SEQUENCE_CACHE_SIZE = 1000
+
+# Environment variable pointing to the persistent resolution index database.
+# Set it to an empty string or "0" to disable the index.
+RESOLUTION_INDEX_ENV_VAR = "TK_KATANA_RESOLUTION_INDEX"
+
+# Number of new index entries buffered before they are written to disk
+RESOLUTION_INDEX_FLUSH_SIZE = 100
+
+# Seconds a lookup waits for the database lock of another process before
+# falling back to the templates, and the background writer before giving up
+RESOLUTION_INDEX_READ_TIMEOUT = 0.5
+RESOLUTION_INDEX_WRITE_TIMEOUT = 30
+
+# Field carrying the template name in the fields returned by getAssetFields
+# with includeDefaults, so that Katana hands it back to createAssetAndPath
+TEMPLATE_FIELD = "__template__"
+
+# Number of independently locked segments of the resolution cache, so that
+# concurrent resolves of different asset IDs rarely wait on each other
+RESOLUTION_CACHE_STRIPES = 16
+
+# Names of the template key holding the version of an asset
+VERSION_FIELDS = ("Version", "version")
+
+# Version tags understood by resolveAssetVersion, besides explicit version numbers
+VERSION_TAG_LATEST = "latest"
+VERSION_TAG_APPROVED = "approved"
+
+# Statuses of the published files considered approved
+APPROVED_STATUSES = ("apr",)
+
+# Attributes of the template keys which change the paths built from a template,
+# hashed with the template definition to key the resolution index
+TEMPLATE_KEY_ATTRIBUTES = (
+    "default", "choices", "format_spec", "filter_by", "length", "exclusions", "is_abstract",
+    "shotgun_entity_type", "shotgun_field_name",
+)
+
+# Matches explicit version tags, e.g. "12" or "v012"
+_VERSION_NUMBER = re.compile(r"^v?(\d+)$")
+
+# Splits a string into tokens, keeping the whitespace separating them
+_WHITESPACE_SPLIT = re.compile(r"(\s+)")
+
+
+def _importEngineModule(name):
+    """
+    Imports a standalone module of the engine with the loader of
+    {engine}/python/tk_katana/standalone.py. This plug-in lives in {engine}/resources/Katana/AssetPlugins.
+    """
+    loader = sys.modules.get("tk_katana_standalone")
+    if loader is None:
+        enginePath = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        loader = imp.load_source("tk_katana_standalone", os.path.join(enginePath, "python", "tk_katana", "standalone.py"))
+    return loader.import_engine_module(name)
+
+
+def _getLogger():
+    """
+    Returns the logger of the plug-in: a child of the engine's logger, so that
+    its messages go through the engine's queued logging backend and resolving
+    threads never block on terminal or NFS log writes.
+    """
+    try:
+        engineLogger = _importEngineModule("log_backend").get_logger()
+    except Exception:
+        return logging.getLogger('ShotgunAssetPlugin')
+    logger = engineLogger.getChild('ShotgunAssetPlugin')
+    # The engine logger lets everything through, its debug messages being filtered by the engine
+    logger.setLevel(logging.INFO)
+    return logger
+
+
 # Set-up plug-in logger
-#log = logging.getLogger('ShotgunAssetPlugin') # TODO
+log = _getLogger()
+
+
+class ResolutionCache(object):
+    """
+    A bounded least-recently-used mapping of normalized asset IDs to resolved
+    file paths. Keeps hit, miss and eviction counters so the efficiency of the
+    cache can be inspected from a Katana session. All operations are thread safe.
+    """
+    def __init__(self, maxSize):
+        self.maxSize = max(0, int(maxSize))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, marking it as the most recently used,
+        or default if the key is not cached.
+        """
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+
+    def peek(self, key, default=None):
+        """
+        Returns the value cached for key, or default, without marking it as
+        recently used nor counting a hit or a miss.
+        """
+        with self._lock:
+            return self._entries.get(key, default)
+
+
+    def set(self, key, value):
+        """
+        Caches value for key, evicting the least recently used entry if the
+        cache is full.
+        """
+        if not self.maxSize:
+            return
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            elif len(self._entries) >= self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = value
+
+
+    def clear(self):
+        """
+        Removes all entries and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+    def statistics(self):
+        """
+        Returns a dict with the current size and counters of the cache.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxSize": self.maxSize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class StripedResolutionCache(object):
+    """
+    A ResolutionCache split in independently locked segments, selected by the
+    hash of the keys, so that threads resolving different asset IDs don't
+    contend on a single lock. Each segment holds an equal share of maxSize.
+    """
+    def __init__(self, maxSize, stripes=RESOLUTION_CACHE_STRIPES):
+        self.maxSize = max(0, int(maxSize))
+        stripeSize = (self.maxSize + stripes - 1) // stripes
+        self._stripes = [ResolutionCache(stripeSize) for i in xrange(stripes)]
+
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if the key is not cached.
+        """
+        return self._stripe(key).get(key, default)
+
+
+    def peek(self, key, default=None):
+        """
+        Returns the value cached for key, or default, without counting it.
+        """
+        return self._stripe(key).peek(key, default)
+
+
+    def set(self, key, value):
+        """
+        Caches value for key.
+        """
+        self._stripe(key).set(key, value)
+
+
+    def clear(self):
+        """
+        Removes all entries and resets the counters.
+        """
+        for stripe in self._stripes:
+            stripe.clear()
+
+
+    def statistics(self):
+        """
+        Returns a dict with the current size and counters of the cache.
+        """
+        statistics = {"size": 0, "maxSize": self.maxSize, "hits": 0, "misses": 0, "evictions": 0}
+        for stripe in self._stripes:
+            for (name, value) in stripe.statistics().iteritems():
+                if name != "maxSize":
+                    statistics[name] += value
+        return statistics
+
+
+class _ResolutionFlight(object):
+    """
+    A resolution in progress, which threads asking for the same asset ID wait
+    for instead of resolving it again.
+    """
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AssetId(object):
+    """
+    An immutable, hashable asset ID made of a Shotgun template name and the
+    fields to apply to it. Its string form is the one stored in Katana
+    parameters: "{'template': <name>, 'fields': {<key>: <value>, ...}}".
+    """
+    __slots__ = ("template", "items", "key")
+
+    def __init__(self, template, fields):
+        items = tuple(sorted((k, _freezeFieldValue(v)) for (k, v) in fields.items()))
+        object.__setattr__(self, "template", template)
+        object.__setattr__(self, "items", items)
+        object.__setattr__(self, "key", (template, items))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AssetId objects are immutable")
+
+
+    def __delattr__(self, name):
+        raise AttributeError("AssetId objects are immutable")
+
+
+    @property
+    def fields(self):
+        """
+        A new dict of the fields of this asset ID.
+        """
+        return dict(self.items)
+
+
+    def __eq__(self, other):
+        return isinstance(other, AssetId) and self.key == other.key
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+    def __str__(self):
+        return "{'template': %r, 'fields': %r}" % (self.template, self.fields)
+
+
+    def __repr__(self):
+        return "AssetId(%r, %r)" % (self.template, self.fields)
+
+
+def _freezeFieldValue(value):
+    """
+    Converts the list values that may appear in asset ID fields to tuples so
+    that AssetId objects are hashable.
+    """
+    if isinstance(value, list):
+        return tuple(_freezeFieldValue(v) for v in value)
+    return value
+
+
+# Marks strings that are known not to be asset IDs in the parse cache
+_INVALID_ASSET_ID = object()
+_assetIdCache = StripedResolutionCache(ASSET_ID_CACHE_SIZE)
+
+
+def parseAssetId(string):
+    """
+    Returns the AssetId described by the given string, or None if the string is
+    not an asset ID. Parsed strings are cached, so each distinct string is only
+    parsed once.
+    """
+    if isinstance(string, AssetId):
+        return string
+    if not isinstance(string, basestring):
+        string = str(string)
+
+    # Cheap rejection of paths and other tokens, which are not cached so that
+    # they don't push asset IDs out of the cache
+    stripped = string.strip()
+    if not (stripped.startswith("{") and stripped.endswith("}")):
+        return None
+
+    assetId = _assetIdCache.get(string)
+    if assetId is None:
+        assetId = _parseAssetIdString(string)
+        if assetId is None:
+            assetId = _INVALID_ASSET_ID
+        _assetIdCache.set(string, assetId)
+
+    if assetId is _INVALID_ASSET_ID:
+        return None
+    return assetId
+
+
+def _parseAssetIdString(string):
+    """
+    Parses an asset ID string with a literal-only parser. Returns None if the
+    string is not an asset ID.
+    """
+    try:
+        fullDict = ast.literal_eval(string.strip())
+    except (ValueError, SyntaxError, TypeError, MemoryError, RuntimeError):
+        # TypeError: unhashable dict keys, MemoryError and RuntimeError: too deeply nested literals
+        return None
+    if not isinstance(fullDict, dict) or "template" not in fullDict or "fields" not in fullDict:
+        return None
+    if not isinstance(fullDict["template"], basestring):
+        return None
+    fields = fullDict["fields"] or {}
+    if not isinstance(fields, dict):
+        return None
+    try:
+        assetId = AssetId(fullDict["template"], fields)
+        hash(assetId)
+    except TypeError:
+        return None
+    return assetId
+
+
+def getResolutionCacheSize():
+    """
+    Returns the size of the resolution cache as configured on the running
+    engine, or DEFAULT_RESOLUTION_CACHE_SIZE when no engine is running.
+    """
+    engine = tank.platform.current_engine()
+    if engine is None:
+        return DEFAULT_RESOLUTION_CACHE_SIZE
+    return engine.get_setting("asset_resolution_cache_size", DEFAULT_RESOLUTION_CACHE_SIZE)
+
+
+class ResolutionIndex(object):
+    """
+    A persistent index of resolved asset paths stored in a SQLite database, so
+    that Katana sessions and farm renders using the same pipeline configuration
+    don't all re-derive the same paths from templates.
+
+    Entries are keyed by pipeline configuration, template name, a hash of the
+    template definition, keys and storage root, and the normalized asset ID, so
+    editing a template, one of its keys or moving a storage root invalidates
+    its entries. New entries are buffered and written in a single transaction
+    by a background thread, and at exit, so that resolving threads never wait
+    on the database lock of another process. Lookups give up quickly on a
+    locked database and fall back to the templates.
+
+    Concurrent processes share the database through SQLite's file locking,
+    which is unreliable on NFS and other network file systems, where the
+    default database, in the cache folder of the pipeline configuration,
+    usually lives. On such storage, point TK_KATANA_RESOLUTION_INDEX to a
+    local path, or pre-warm a database once and share it read-only.
+    """
+    def __init__(self, dbPath, configKey):
+        self.dbPath = dbPath
+        self.configKey = configKey
+        # The connection of the lookups, and the one of the writes, used by
+        # the background writer and flush
+        self._connection = None
+        self._writeConnection = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._writeLock = threading.Lock()
+        self._writer = None
+        self._wakeWriter = threading.Event()
+        self._closed = False
+        # Set when the database can't be used, in which case the index does nothing
+        self._disabled = False
+        _resolutionIndexes.add(self)
+
+
+    def _connect(self, timeout):
+        """
+        Returns a new connection to the database, creating the database if
+        needed, or None if the database can't be used.
+        """
+        if self._disabled:
+            return None
+        try:
+            dbDir = os.path.dirname(self.dbPath)
+            if dbDir and not os.path.isdir(dbDir):
+                os.makedirs(dbDir)
+            connection = sqlite3.connect(self.dbPath, timeout=timeout, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS resolution ("
+                "config TEXT, template TEXT, definition_hash TEXT, asset_key TEXT, path TEXT, "
+                "PRIMARY KEY (config, template, definition_hash, asset_key))"
+            )
+            connection.commit()
+            return connection
+        except (sqlite3.Error, OSError, IOError), e:
+            log.warning("ResolutionIndex: Disabling index %s: %s" % (self.dbPath, e))
+            self._disabled = True
+            return None
+
+
+    def lookup(self, parsedId, definitionHash):
+        """
+        Returns the path stored for the given asset ID, or None.
+        """
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect(RESOLUTION_INDEX_READ_TIMEOUT)
+            if self._connection is None:
+                return None
+            try:
+                row = self._connection.execute(
+                    "SELECT path FROM resolution "
+                    "WHERE config = ? AND template = ? AND definition_hash = ? AND asset_key = ?",
+                    (self.configKey, parsedId.template, definitionHash, repr(parsedId.items))
+                ).fetchone()
+            except sqlite3.Error, e:
+                log.warning("ResolutionIndex: Lookup failed in %s: %s" % (self.dbPath, e))
+                return None
+        if row is None:
+            return None
+        return str(row[0])
+
+
+    def store(self, parsedId, definitionHash, path):
+        """
+        Records the path of the given asset ID. Entries are written to disk in
+        batches by a background thread, see flush.
+        """
+        with self._lock:
+            if self._disabled or self._closed:
+                return
+            self._pending.append(
+                (self.configKey, parsedId.template, definitionHash, repr(parsedId.items), path)
+            )
+            if len(self._pending) < RESOLUTION_INDEX_FLUSH_SIZE:
+                return
+            self._startWriter()
+        self._wakeWriter.set()
+
+
+    def _startWriter(self):
+        """
+        Starts the background writer if it is not running. Must be called with
+        the lock held.
+        """
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._runWriter, name="ResolutionIndex writer")
+            self._writer.daemon = True
+            self._writer.start()
+
+
+    def _runWriter(self):
+        while True:
+            self._wakeWriter.wait()
+            self._wakeWriter.clear()
+            self.flush()
+            if self._closed:
+                break
+        with self._writeLock:
+            if self._writeConnection is not None:
+                self._writeConnection.close()
+                self._writeConnection = None
+
+
+    def flush(self):
+        """
+        Writes the buffered entries to the database, waiting for the database
+        locks of other processes.
+        """
+        with self._writeLock:
+            with self._lock:
+                pending = self._pending
+                self._pending = []
+            if not pending:
+                return
+            if self._writeConnection is None:
+                self._writeConnection = self._connect(RESOLUTION_INDEX_WRITE_TIMEOUT)
+            if self._writeConnection is None:
+                return
+            try:
+                with self._writeConnection:
+                    self._writeConnection.executemany(
+                        "INSERT OR REPLACE INTO resolution VALUES (?, ?, ?, ?, ?)", pending
+                    )
+            except sqlite3.Error, e:
+                log.warning("ResolutionIndex: Unable to write to %s: %s" % (self.dbPath, e))
+
+
+    def close(self):
+        """
+        Stops using the index: the buffered entries are written by the
+        background writer, which then exits, and the connections are closed.
+        """
+        with self._lock:
+            self._closed = True
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            if self._pending:
+                self._startWriter()
+            writer = self._writer
+        if writer is not None:
+            self._wakeWriter.set()
+
+
+def _flushResolutionIndexes():
+    """
+    Writes the buffered entries of the resolution indexes at exit.
+    """
+    for index in list(_resolutionIndexes):
+        index.flush()
+
+
+# The resolution indexes of the process, flushed at exit. Indexes dropped by
+# ShotgunAssetPlugin.reset are released once their writer is done.
+_resolutionIndexes = weakref.WeakSet()
+atexit.register(_flushResolutionIndexes)
+
+
+class ShotgunTransaction(object):
+    """
+    Queues the Shotgun requests of the assets created through the AssetAPI
+    and sends them in a single batch call when committed.
+    """
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._publishes = []
+
+
+    def addPublish(self, data, publishType):
+        """
+        Queues the creation of a published file.
+
+        :param data: The fields of the published file entity.
+        :param publishType: The name of the publish type to link the published
+                            file to, or None.
+        """
+        self._publishes.append((data, publishType))
+
+
+    def commit(self):
+        """
+        Creates all the queued published files in a single batch request.
+        Returns the created entities.
+        """
+        publishes = self._publishes
+        self._publishes = []
+        if not publishes:
+            return []
+        return self._plugin.registerPublishes(publishes)
+
+
+    def cancel(self):
+        """
+        Discards all the queued requests.
+        """
+        self._publishes = []
+
+
+def getPublishedFileEntityTypes(tk):
+    """
+    Returns the published file entity type used by the site, the entity type
+    of its publish types and the field linking them.
+    """
+    try:
+        entityType = tank.util.get_published_file_entity_type(tk)
+    except AttributeError:
+        # Cores predating PublishedFile entities
+        entityType = "TankPublishedFile"
+    if entityType == "PublishedFile":
+        return ("PublishedFile", "PublishedFileType", "published_file_type")
+    return ("TankPublishedFile", "TankType", "tank_type")
+
+
+def getResolutionIndexPath(tk):
+    """
+    Returns the path of the persistent resolution index for the given Tank
+    instance, or None if the index is disabled.
+
+    The index is enabled either by pointing the TK_KATANA_RESOLUTION_INDEX
+    environment variable to a database path, or with the engine setting
+    "asset_resolution_index", in which case the database is stored in the cache
+    folder of the pipeline configuration.
+    """
+    if RESOLUTION_INDEX_ENV_VAR in os.environ:
+        dbPath = os.environ[RESOLUTION_INDEX_ENV_VAR]
+        if dbPath in ("", "0"):
+            return None
+        return dbPath
+
+    engine = tank.platform.current_engine()
+    if engine is None or not engine.get_setting("asset_resolution_index", False):
+        return None
+    return os.path.join(tk.pipeline_configuration.get_path(), "cache", "tk-katana", "resolution_index.db")
 
 
 class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
@@ -22,44 +655,196 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
     implements all abstract functions from the plug-in interface. 
     """
     def __init__(self):
-        # Create a Tank instance
-        self.tk = None
-        self.setupTank()
+        # The Tank instance is only created when first needed, see the tk property.
+        # The serialized context is read now as the init script removes it from
+        # the environment once the engine is started.
+        self._tk = None
+        self._tankSetUp = False
+        self._tankLock = threading.Lock()
+        self._serialisedContext = os.environ.get("TANK_CONTEXT")
+        # Created on first resolve, once the engine settings are available
+        self._resolutionCache = None
+        self._fileSequenceCache = StripedResolutionCache(FILE_SEQUENCE_CACHE_SIZE)
+        # Guards the creation of the caches and the shared state below
+        self._stateLock = threading.RLock()
+        # Resolutions in progress, keyed by asset ID key
+        self._flights = {}
+        # The persistent index and the template definition hashes it relies on
+        self._resolutionIndex = None
+        self._templateHashes = {}
+        # Templates and the names of their keys, keyed by template name
+        self._templates = {}
+        # How many times each template was resolved through apply_fields or abstract paths
+        self._templateStatistics = {}
+        # Shotgun connections of the threads, see __getShotgun
+        self._threadState = threading.local()
+        # Guards the publish caches below, filled from Katana's cooking threads
+        self._publishLock = threading.Lock()
+        # Publish type entities, keyed by name
+        self._publishTypes = {}
+        # Sorted (version_number, status) lists of published files, keyed by asset ID
+        # key without its version
+        self._publishedVersions = {}
+        # Published files with a version, keyed by (entity type, entity id)
+        self._entityPublishes = {}
+
+
+    @property
+    def tk(self):
+        """
+        The Tank instance used to resolve assets, created on first access.
+        """
+        if not self._tankSetUp:
+            with self._tankLock:
+                if not self._tankSetUp:
+                    self.setupTank()
+        return self._tk
+
+
+    @tk.setter
+    def tk(self, tk):
+        self._tk = tk
+        self._tankSetUp = True
 
 
     def setupTank(self):
         '''
         This function relies on the TANK_CONTEXT environment var being previously
-        set by Shotgun.
+        set by Shotgun. If it is not set, the Tank instance of the running engine
+        is used. The Tank instance is taken from the engine's pool, so that the
+        plug-in shares the Shotgun connection of the engine, and its calls are
+        counted in the Shotgun statistics.
         '''
+        startTime = time.time()
         context = None
         # Attempt to find context in environment
-        if "TANK_CONTEXT" in os.environ:
-            serialised_context = os.environ.get("TANK_CONTEXT")
-            if serialised_context:
-                context = tank.context.deserialize(serialised_context)
+        serialised_context = self._serialisedContext or os.environ.get("TANK_CONTEXT")
+        if serialised_context:
+            context = tank.context.deserialize(serialised_context)
         if context:
-            self.tk = context.tank
+            self._tk = context.tank
+        else:
+            engine = tank.platform.current_engine()
+            if engine is not None:
+                self._tk = engine.tank
+        if self._tk is not None:
+            try:
+                self._tk = _importEngineModule("tank_pool").get_pool().get(self._tk)
+                _importEngineModule("shotgun_stats").get_stats().instrument(self._tk.shotgun)
+            except Exception, e:
+                log.warning("setupTank: Could not use the engine's Tank pool: %s" % e)
+        self._tankSetUp = True
+        log.debug("setupTank: Tank instance set up in %.3fs" % (time.time() - startTime))
 
 
     def reset(self):
         """
         Resets the state of the plug-in
         """
-        # Nothing to reset in this plug-in... If, for example, some caching was
-        # implemented then this would be the place to clear it.
-        pass
+        # Drop the resolution cache, it will be recreated with the current
+        # engine settings on the next resolve
+        with self._stateLock:
+            if self._resolutionCache is not None:
+                self._resolutionCache.clear()
+            self._resolutionCache = None
+            self._fileSequenceCache.clear()
+            if self._resolutionIndex:
+                self._resolutionIndex.close()
+            self._resolutionIndex = None
+            self._templateHashes = {}
+            self._templates = {}
+            self._templateStatistics = {}
+            self._threadState = threading.local()
+            with self._publishLock:
+                self._publishedVersions = {}
+                self._entityPublishes = {}
+
+
+    def getResolutionCache(self):
+        """
+        Returns the cache of resolved asset paths, creating it if needed.
+        """
+        resolutionCache = self._resolutionCache
+        if resolutionCache is None:
+            with self._stateLock:
+                if self._resolutionCache is None:
+                    self._resolutionCache = StripedResolutionCache(getResolutionCacheSize())
+                resolutionCache = self._resolutionCache
+        return resolutionCache
+
+
+    def getResolutionIndex(self):
+        """
+        Returns the persistent resolution index, or None if it is disabled.
+        """
+        if self._resolutionIndex is None:
+            with self._stateLock:
+                if self._resolutionIndex is None:
+                    dbPath = getResolutionIndexPath(self.tk)
+                    if not dbPath:
+                        # Don't look for the index path again until the next reset
+                        self._resolutionIndex = False
+                    else:
+                        configKey = "%s:%s" % (sys.platform, self.tk.pipeline_configuration.get_path())
+                        self._resolutionIndex = ResolutionIndex(dbPath, configKey)
+        return self._resolutionIndex or None
 
 
-    def isAssetId(self, string): # TODO
+    def getTemplateStatistics(self):
+        """
+        Returns a dict keyed by template name of the number of resolutions made
+        with template.apply_fields ("applyFields") and with abstract paths
+        looked up on disk ("abstractPaths").
+        """
+        with self._stateLock:
+            return dict((name, dict(stats)) for (name, stats) in self._templateStatistics.iteritems())
+
+
+    def __getTemplate(self, templateType):
+        '''
+        Returns the template with the given name and the set of its key names,
+        or (None, None) if there is no such template.
+        '''
+        try:
+            return self._templates[templateType]
+        except KeyError:
+            pass
+        with self._stateLock:
+            if templateType not in self._templates:
+                template = self.tk.templates.get(templateType)
+                if template:
+                    templateInfo = (template, frozenset(template.keys))
+                    self._templateStatistics[templateType] = {"applyFields": 0, "abstractPaths": 0}
+                else:
+                    templateInfo = (None, None)
+                self._templates[templateType] = templateInfo
+            return self._templates[templateType]
+
+
+    def __getTemplateHash(self, template):
+        '''
+        Returns a hash of the definition of the given template, of the definition
+        of its keys and of the storage roots the paths are built from.
+        '''
+        templateHash = self._templateHashes.get(template.name)
+        if templateHash is None:
+            digest = hashlib.sha1(repr(template.definition))
+            for (keyName, key) in sorted(template.keys.items()):
+                digest.update(repr(
+                    (keyName, type(key).__name__) + tuple(getattr(key, a, None) for a in TEMPLATE_KEY_ATTRIBUTES)
+                ))
+            digest.update(repr(getattr(template, "root_path", None)))
+            digest.update(repr(sorted((getattr(self.tk, "roots", None) or {}).items())))
+            templateHash = digest.hexdigest()
+            self._templateHashes[template.name] = templateHash
+        return templateHash
+
+
+    def isAssetId(self, string):
         """
         Checks if the given string is a valid asset ID
         """
-        # This is a very simplistic test... but it conveys the idea of this function
-        fullDict = eval(str(string))
-        if fullDict.has_key("template") and fullDict.has_key("fields"):
-            return True
-        return None
+        return parseAssetId(string) is not None
 
 
     def resolveAsset(self, assetId, throwOnError=False):
@@ -69,44 +854,166 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         if assetId == "":
             return None
 
-        if not self.isAssetId(assetId):
+        parsedId = parseAssetId(assetId)
+        if parsedId is None:
             # Return the assetId as it is if it is not recognized
             log.warning("resolveAsset: asset ID %s is not a valid asset. Skipping resolving asset." % assetId)
             return assetId
 
+        return self.__resolveParsedAssetId(parsedId)
+
+
+    def __resolveParsedAssetId(self, parsedId):
+        '''
+        Returns the path referenced by a parsed asset ID, using the resolution cache.
+        Threads resolving an asset ID that another thread is already resolving wait
+        for and share its result.
+        '''
+        # Look for a previous resolution of the same template and fields
+        cache = self.getResolutionCache()
+        assetFilePath = cache.get(parsedId.key)
+        if assetFilePath is not None:
+            return assetFilePath
+
+        with self._stateLock:
+            # A flight which completed since the lookup above cached its result
+            # before leaving, don't resolve the asset ID again
+            assetFilePath = cache.peek(parsedId.key)
+            if assetFilePath is not None:
+                return assetFilePath
+            flight = self._flights.get(parsedId.key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[parsedId.key] = _ResolutionFlight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.__resolveUncachedAssetId(parsedId, cache)
+        except Exception, e:
+            flight.error = e
+            raise
+        finally:
+            with self._stateLock:
+                del self._flights[parsedId.key]
+            flight.done.set()
+        return flight.result
+
+
+    def __resolveUncachedAssetId(self, parsedId, cache):
+        '''
+        Resolves a parsed asset ID with template.apply_fields when all its keys are
+        given, and otherwise from the persistent index or the abstract paths of the
+        template. Stores the result in the given cache.
+        '''
         # Get fields
-        idFieldDict = self.getAssetFields(assetId)
+        idFieldDict = self.getAssetFields(parsedId)
         if not idFieldDict:
-            log.warning("resolveAsset: Resolving asset path from asset ID failed: %s" % assetId)
+            log.warning("resolveAsset: Resolving asset path from asset ID failed: %s" % parsedId)
             return None
 
         # Get template
-        templateType = self.__getAssetPublishType(assetId)
-        template = self.tk.templates[templateType]
+        templateType = self.__getAssetPublishType(parsedId)
+        (template, keyNames) = self.__getTemplate(templateType)
         if not template:
             log.warning("resolveAsset: Unable to find template: %s" % templateType)
+            return None
+
+        if keyNames.issubset(idFieldDict):
+            # All the keys are given, no need to look for abstract paths on disk
+            try:
+                # (conversion from unicode to str needed)
+                assetFilePath = str(template.apply_fields(idFieldDict))
+                self.__countTemplateResolution(templateType, "applyFields")
+                cache.set(parsedId.key, assetFilePath)
+                return assetFilePath
+            except tank.TankError, e:
+                log.debug("resolveAsset: Unable to apply fields to template %s: %s" % (templateType, e))
+
+        # Abstract paths are kept in the persistent index when they don't depend on
+        # the files on disk, i.e. when only abstract keys such as SEQ are missing
+        index = None
+        if self.__hasOnlyAbstractKeysMissing(template, keyNames, idFieldDict):
+            index = self.getResolutionIndex()
+        if index:
+            # Look for a resolution made by a previous Katana session
+            templateHash = self.__getTemplateHash(template)
+            assetFilePath = index.lookup(parsedId, templateHash)
+            if assetFilePath is not None:
+                cache.set(parsedId.key, assetFilePath)
+                return assetFilePath
 
         assetFilePathList = self.tk.abstract_paths_from_template( template, idFieldDict )
+        self.__countTemplateResolution(templateType, "abstractPaths")
         assetFilePath = ""
         if len(assetFilePathList) > 0:
             # (conversion from unicode to str needed)
             assetFilePath = str(assetFilePathList[0])
+
+        cache.set(parsedId.key, assetFilePath)
+        if index and assetFilePath:
+            index.store(parsedId, templateHash, assetFilePath)
         return assetFilePath
 
 
+    def __hasOnlyAbstractKeysMissing(self, template, keyNames, fields):
+        '''
+        Returns whether the keys of the template missing from the fields are all
+        abstract keys, such as SEQ, in which case the abstract path of the fields
+        is derived from the template alone rather than found on disk.
+        '''
+        missing = keyNames.difference(fields)
+        if not missing:
+            return False
+        for keyName in missing:
+            if not getattr(template.keys[keyName], "is_abstract", False):
+                return False
+        return True
+
+
+    def __countTemplateResolution(self, templateType, method):
+        '''
+        Increments the statistics of the given template for the given resolution method.
+        '''
+        with self._stateLock:
+            statistics = self._templateStatistics.get(templateType)
+            if statistics is not None:
+                statistics[method] += 1
+
+
     def resolveAllAssets(self, string):
         """
         For each asset ID found in the given string (isolated by whitespaces)
         it will be resolved and the original string will be substituted
         """
-        result = string
+        # Tokens are at even indices, the whitespace separating them at odd ones
+        tokens = _WHITESPACE_SPLIT.split(string)
 
-        for token in string.split():
-            if self.isAssetId(token):
-                path = self.resolveAsset(token)
-                result = result.replace(token, path)
+        # Parse each distinct token once
+        parsedIds = {}
+        for token in tokens[::2]:
+            if token and token not in parsedIds:
+                parsedId = parseAssetId(token)
+                if parsedId is not None:
+                    parsedIds[token] = parsedId
+        if not parsedIds:
+            return string
 
-        return result
+        # Resolve each distinct asset ID once
+        paths = {}
+        for parsedId in set(parsedIds.itervalues()):
+            paths[parsedId] = self.__resolveParsedAssetId(parsedId)
+
+        # Substitute in a single pass
+        for i in xrange(0, len(tokens), 2):
+            parsedId = parsedIds.get(tokens[i])
+            if parsedId is not None and paths[parsedId] is not None:
+                tokens[i] = paths[parsedId]
+        return "".join(tokens)
 
 
     def resolvePath(self, assetId, frame):  # TODO -- This may need some work to work properly. How do Shotgun and Katana work with file sequences?
@@ -119,30 +1026,191 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         if not resolvedAsset:
             return
 
-        # Get the fileSequence plug-in and if the resolvedAsset is a file sequence
-        # path, then use frame to resolve it
-        fileSequencePlugin = AssetAPI.GetDefaultFileSequencePlugin()
-        if fileSequencePlugin:
-            if fileSequencePlugin.isFileSequence(resolvedAsset):
-                # Get the FileSequence object and resolve the sequence with frame
-                fileSequence = fileSequencePlugin.getFileSequence(resolvedAsset)
-                resolvedAsset = fileSequence.getResolvedPath(frame)
+        # If the resolvedAsset is a file sequence path, then use frame to resolve it
+        fileSequence = self.__getFileSequence(resolvedAsset)
+        if fileSequence is not None:
+            resolvedAsset = fileSequence.getResolvedPath(frame)
 
         return resolvedAsset
 
 
+    def resolvePathRange(self, assetId, frames):
+        """
+        Resolves the given asset ID once and returns the list of its paths for
+        each of the given frames. If the asset is not a file sequence, its path
+        is repeated for each frame. Returns None if the asset can't be resolved.
+        """
+        resolvedAsset = self.resolveAsset(assetId)
+        if not resolvedAsset:
+            return
+
+        fileSequence = self.__getFileSequence(resolvedAsset)
+        if fileSequence is None:
+            return [resolvedAsset for frame in frames]
+
+        getResolvedPath = fileSequence.getResolvedPath
+        return [getResolvedPath(frame) for frame in frames]
+
+
+    def __getFileSequence(self, resolvedAsset):
+        '''
+        Returns the FileSequence object of a resolved path using the currently
+        selected FileSequence plug-in, or None if the path is not a file sequence.
+        FileSequence objects are cached per resolved path.
+        '''
+        fileSequence = self._fileSequenceCache.get(resolvedAsset)
+        if fileSequence is None:
+            fileSequencePlugin = AssetAPI.GetDefaultFileSequencePlugin()
+            if not fileSequencePlugin:
+                return None
+            # False marks paths known not to be file sequences
+            fileSequence = False
+            if fileSequencePlugin.isFileSequence(resolvedAsset):
+                fileSequence = fileSequencePlugin.getFileSequence(resolvedAsset)
+            self._fileSequenceCache.set(resolvedAsset, fileSequence)
+        return fileSequence or None
+
+
     def resolveAssetVersion(self, assetId, versionTag = ""):
         """
         Returns the version for the given asset ID.
         If it is a partial asset ID (which doesn't have a version) then None is returned
+
+        versionTag can be "latest", "approved" or an explicit version number such as
+        "12" or "v012", in which case the version is looked up among the published
+        files of the asset and None is returned if there is no such version.
         """
         # Get fields
         idFieldDict = self.getAssetFields(assetId)
         if not idFieldDict:
             log.warning("resolveAssetVersion: Resolving asset path from asset ID failed: %s" % assetId)
             return None
-        # Version
-        return idFieldDict.get("Version", None)
+        if not versionTag:
+            # Version
+            for versionField in VERSION_FIELDS:
+                if versionField in idFieldDict:
+                    return str(idFieldDict[versionField])
+            return None
+
+        versionTag = str(versionTag).strip().lower()
+        versionMatch = _VERSION_NUMBER.match(versionTag)
+        if versionTag not in (VERSION_TAG_LATEST, VERSION_TAG_APPROVED) and not versionMatch:
+            log.warning("resolveAssetVersion: Unknown version tag: %s" % versionTag)
+            return None
+
+        parsedId = parseAssetId(assetId)
+        self.prefetchAssetVersions([parsedId])
+        with self._publishLock:
+            publishedVersions = self._publishedVersions.get(self.__getVersionlessKey(parsedId)) or []
+
+        if versionMatch:
+            version = int(versionMatch.group(1))
+            versions = [v for (v, status) in publishedVersions if v == version]
+        elif versionTag == VERSION_TAG_APPROVED:
+            versions = [v for (v, status) in publishedVersions if status in APPROVED_STATUSES]
+        else:
+            versions = [v for (v, status) in publishedVersions]
+        if not versions:
+            return None
+        return str(versions[-1])
+
+
+    def prefetchAssetVersions(self, assetIds):
+        """
+        Fetches the published versions of the given asset IDs, so that resolving
+        their version tags doesn't query Shotgun. The published files of each
+        entity are fetched once, in a single query for all the entities not
+        fetched yet, and cached until the next reset, so that the other assets
+        of an entity, resolved one at a time by Katana, don't query Shotgun again.
+        """
+        # Work out the entity of the assets whose versions are not known yet
+        pending = {}
+        for assetId in assetIds:
+            parsedId = parseAssetId(assetId)
+            if parsedId is None:
+                continue
+            key = self.__getVersionlessKey(parsedId)
+            with self._publishLock:
+                if key in self._publishedVersions or key in pending:
+                    continue
+            (template, keyNames) = self.__getTemplate(parsedId.template)
+            assetFilePath = self.__resolveParsedAssetId(parsedId)
+            entity = None
+            if template and assetFilePath:
+                entity = self.tk.context_from_path(assetFilePath).entity
+            if not entity:
+                with self._publishLock:
+                    self._publishedVersions[key] = []
+                continue
+            pending[key] = (template, keyNames, (entity["type"], entity["id"]), parsedId.fields)
+        if not pending:
+            return
+
+        # Fetch the published files of the entities not fetched yet. Another
+        # thread may fetch the same entity meanwhile, which is harmless.
+        with self._publishLock:
+            missing = set(entityKey for (t, k, entityKey, f) in pending.itervalues()
+                          if entityKey not in self._entityPublishes)
+        if missing:
+            (entityType, typeEntityType, typeField) = getPublishedFileEntityTypes(self.tk)
+            publishes = self.__getShotgun().find(
+                entityType,
+                [
+                    ["entity", "in", [{"type": t, "id": i} for (t, i) in missing]],
+                    ["version_number", "is_not", None],
+                ],
+                ["entity", "name", "version_number", "sg_status_list", "path"]
+            )
+            entityPublishes = dict((entityKey, []) for entityKey in missing)
+            for publish in publishes:
+                if publish["entity"]:
+                    entityKey = (publish["entity"]["type"], publish["entity"]["id"])
+                    entityPublishes.setdefault(entityKey, []).append(publish)
+            with self._publishLock:
+                self._entityPublishes.update(entityPublishes)
+
+        # Dispatch the published files between the assets, using the fields of their
+        # paths to tell apart the publishes of the same entity and name, e.g. of
+        # other steps, outputs or AOVs
+        for (key, (template, keyNames, entityKey, fields)) in pending.iteritems():
+            name = fields.get("name")
+            versions = []
+            with self._publishLock:
+                publishes = self._entityPublishes.get(entityKey) or []
+            for publish in publishes:
+                path = (publish.get("path") or {}).get("local_path")
+                if ((name is None or publish["name"] == name)
+                        and publish["version_number"] is not None
+                        and path and self.__pathMatchesFields(template, keyNames, fields, path)):
+                    versions.append((publish["version_number"], publish.get("sg_status_list")))
+            versions.sort()
+            with self._publishLock:
+                self._publishedVersions[key] = versions
+
+
+    def __pathMatchesFields(self, template, keyNames, fields, path):
+        '''
+        Returns whether the given path matches the template with the same fields
+        as an asset ID, apart from its version and abstract fields.
+        '''
+        try:
+            pathFields = template.get_fields(path)
+        except tank.TankError:
+            return False
+        for (keyName, value) in fields.iteritems():
+            if (keyName not in keyNames or keyName in VERSION_FIELDS
+                    or getattr(template.keys[keyName], "is_abstract", False)):
+                continue
+            if pathFields.get(keyName) != value:
+                return False
+        return True
+
+
+    def __getVersionlessKey(self, parsedId):
+        '''
+        Returns the key of an asset ID without its version field.
+        '''
+        return (parsedId.template, tuple(item for item in parsedId.items if item[0] not in VERSION_FIELDS))
 
 
     def getAssetFields(self, assetId, includeDefaults=False):
@@ -150,10 +1218,15 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         Resolves an asset ID to a dict of all of the required fields.
         Returns a dict, keyed by the field names that the corresponding Shotgun template will expect
         """
-        fullDict = eval(str(assetId)) # TODO: Not cool, but works in this case. Switch to json?
-        fieldDict = fullDict.get("fields") or None
+        parsedId = parseAssetId(assetId)
+        if parsedId is None:
+            log.warning("getAssetFields: Invalid asset ID: %s" % assetId)
+            return None
+        fieldDict = parsedId.fields or None
         if not fieldDict:
             log.warning("getAssetFields: Couldn't find fields in asset ID: %s" % assetId)
+        elif includeDefaults:
+            fieldDict[TEMPLATE_FIELD] = parsedId.template
         return fieldDict
 
 
@@ -161,8 +1234,11 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         '''
         Returns the publish "type" of the asset. This is used to work out the Shotgun template to use.
         '''
-        fullDict = eval(str(assetId)) # TODO: Not cool, but works in this case. Switch to json?
-        templateType = fullDict.get("template") or None
+        parsedId = parseAssetId(assetId)
+        if parsedId is None:
+            log.warning("getAssetFields: Invalid asset ID: %s" % assetId)
+            return None
+        templateType = parsedId.template or None
         if not templateType:
             log.warning("getAssetFields: Couldn't find template type in asset ID: %s" % assetId)
         return templateType
@@ -172,11 +1248,167 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         """
         Creates a transaction object
         """
-        # In this example plug-in we do not support transactions
-        return None
+        return ShotgunTransaction(self)
+
+
+    def createAssetAndPath(self, txn, assetType, assetFields, args, createDirectory):
+        """
+        Creates the asset ID for the given fields and returns it, creating the
+        directory of the file it references if requested.
+        The template to use is read from the fields returned by getAssetFields,
+        or from the "template" argument.
+        """
+        parsedId = self.__getCreatedAssetId(assetFields, args)
+        if parsedId is None:
+            return None
+
+        if createDirectory:
+            assetFilePath = self.__resolveParsedAssetId(parsedId)
+            assetDir = os.path.dirname(assetFilePath or "")
+            if assetDir and not os.path.isdir(assetDir):
+                os.makedirs(assetDir)
+
+        return str(parsedId)
+
+
+    def postCreateAsset(self, txn, assetType, assetFields, args):
+        """
+        Registers the created asset as a published file in Shotgun and returns
+        its asset ID. The publish is queued in the transaction if one is given,
+        and sent immediately otherwise.
+        """
+        parsedId = self.__getCreatedAssetId(assetFields, args)
+        if parsedId is None:
+            return None
+
+        assetFilePath = self.__resolveParsedAssetId(parsedId)
+        if not assetFilePath:
+            log.warning("postCreateAsset: Unable to resolve created asset: %s" % parsedId)
+            return str(parsedId)
+
+        fields = parsedId.fields
+        context = self.__getPublishContext()
+        if context is None:
+            context = self.tk.context_from_path(assetFilePath)
+        data = {
+            "project": context.project,
+            "entity": context.entity,
+            "task": context.task,
+            "code": os.path.basename(assetFilePath),
+            "name": fields.get("name") or os.path.basename(assetFilePath),
+            "path": {"local_path": assetFilePath},
+            "version_number": fields.get("Version", fields.get("version")),
+        }
+        publishType = (args or {}).get("publishType") or assetType
+
+        if txn is None:
+            self.registerPublishes([(data, publishType)])
+        else:
+            txn.addPublish(data, publishType)
+        return str(parsedId)
+
+
+    def registerPublishes(self, publishes):
+        """
+        Creates published files in Shotgun with a single batch request.
+
+        :param publishes: A list of (data, publishType) tuples, where data are the
+                          fields of the published file and publishType the name
+                          of its publish type, or None.
+        :returns: The created entities.
+        """
+        (entityType, typeEntityType, typeField) = getPublishedFileEntityTypes(self.tk)
+        publishTypes = self.__getPublishTypes(
+            set(publishType for (data, publishType) in publishes if publishType),
+            typeEntityType
+        )
+        requests = []
+        for (data, publishType) in publishes:
+            data = dict(data)
+            if publishType:
+                data[typeField] = publishTypes[publishType]
+            requests.append({"request_type": "create", "entity_type": entityType, "data": data})
+        return self.__getShotgun().batch(requests)
+
+
+    def __getPublishTypes(self, names, typeEntityType):
+        '''
+        Returns a dict of the publish type entities with the given names, keyed by
+        name. Publish types are cached for the session; the missing ones are looked
+        up in one query and the ones that don't exist yet created in one batch.
+        '''
+        with self._publishLock:
+            missing = [name for name in names if name not in self._publishTypes]
+        if missing:
+            sg = self.__getShotgun()
+            found = dict(
+                (publishType["code"], {"type": typeEntityType, "id": publishType["id"]})
+                for publishType in sg.find(typeEntityType, [["code", "in", missing]], ["code"])
+            )
+            requests = [
+                {"request_type": "create", "entity_type": typeEntityType, "data": {"code": name}}
+                for name in missing if name not in found
+            ]
+            if requests:
+                for publishType in sg.batch(requests):
+                    found[publishType["code"]] = {"type": typeEntityType, "id": publishType["id"]}
+            with self._publishLock:
+                self._publishTypes.update(found)
+        with self._publishLock:
+            return dict((name, self._publishTypes[name]) for name in names)
+
+
+    def __getShotgun(self):
+        '''
+        Returns the Shotgun connection of the calling thread. Katana calls the
+        plug-in from its cooking threads while the engine uses the connection
+        of the Tank instance, and Shotgun connections are not thread safe.
+        '''
+        sg = getattr(self._threadState, "shotgun", None)
+        if sg is None:
+            try:
+                from tank.util import shotgun
+                sg = shotgun.create_sg_connection()
+            except (ImportError, AttributeError, TypeError):
+                # Cores giving each thread its own connection
+                sg = self.tk.shotgun
+            try:
+                _importEngineModule("shotgun_stats").get_stats().instrument(sg)
+            except Exception, e:
+                log.warning("Could not instrument the Shotgun connection: %s" % e)
+            self._threadState.shotgun = sg
+        return sg
+
+
+    def __getCreatedAssetId(self, assetFields, args):
+        '''
+        Returns the AssetId built from the fields and arguments given by Katana
+        when creating an asset, or None if no template is specified.
+        '''
+        fields = dict(assetFields or {})
+        templateType = fields.pop(TEMPLATE_FIELD, None) or (args or {}).get("template")
+        if not templateType:
+            log.warning("createAssetAndPath: No template specified for fields: %s" % assetFields)
+            return None
+        return AssetId(templateType, fields)
+
+
+    def __getPublishContext(self):
+        '''
+        Returns the context of the running engine, or None.
+        '''
+        engine = tank.platform.current_engine()
+        if engine is None:
+            return None
+        return engine.context
+
 
+# The instance of the plug-in registered with Katana. Scripts needing more than
+# the AssetAPI methods, e.g. getResolutionIndex, use it directly, since
+# AssetAPI.GetAssetPlugin returns Katana's own wrapper of it.
+plugin = ShotgunAssetPlugin()
 
 # Register the "Shotgun" plug-in - this is the name that will be
 # shown in Katana's Project Settings tab
-AssetAPI.RegisterAssetPlugin("Shotgun", ShotgunAssetPlugin())
+AssetAPI.RegisterAssetPlugin("Shotgun", plugin)
 
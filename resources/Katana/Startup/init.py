@@ -1,11 +1,35 @@
 """
 Setup the envrionment and menu to run Shotgun tools.
 """
+def import_engine_module(name):
+    """
+    Imports a standalone module of the engine with the loader of
+    {engine}/python/tk_katana/standalone.py. This script lives in {engine}/resources/Katana/Startup.
+    """
+    import os
+    import imp
+    import sys
+
+    loader = sys.modules.get("tk_katana_standalone")
+    if loader is None:
+        engine_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        loader = imp.load_source("tk_katana_standalone", os.path.join(engine_path, "python", "tk_katana", "standalone.py"))
+    return loader.import_engine_module(name)
+
+
 def bootstrap():
     import os
+    from Katana import Configuration
+
+    # the startup ends once this script has run and, in UI sessions, the Shotgun menu is created
+    milestones = ["bootstrap"]
+    if Configuration.get("KATANA_UI_MODE"):
+        milestones.append("menu")
+    profiler = import_engine_module("profiler").start(milestones)
 
     try:
-        import sgtk
+        with profiler.phase("import_sgtk"):
+            import sgtk
     except Exception, e:
         print "Shotgun: Could not import sgtk! %s" % str(e)
         return
@@ -16,13 +40,21 @@ def bootstrap():
 
     engine_name = os.environ.get("TANK_ENGINE")
     try:
-        context = sgtk.context.deserialize(os.environ.get("TANK_CONTEXT"))
+        with profiler.phase("deserialize_context"):
+            context = sgtk.context.deserialize(os.environ.get("TANK_CONTEXT"))
     except Exception, e:
         print "Shotgun: Could not create context! %s" % str(e)
         return
 
+    # fetch the Shotgun data needed to validate the context in the background while the engine starts
     try:
-        engine = sgtk.platform.start_engine(engine_name, context.sgtk, context)
+        import_engine_module("prefetch").start(context.sgtk, context)
+    except Exception, e:
+        print "Shotgun: Could not start prefetching Shotgun data: %s" % str(e)
+
+    try:
+        with profiler.phase("start_engine"):
+            engine = sgtk.platform.start_engine(engine_name, context.sgtk, context)
     except Exception, e:
         print "Shotgun: Could not start engine: %s" % str(e)
         return
@@ -32,4 +64,6 @@ def bootstrap():
         if var in os.environ:
             del os.environ[var]
 
+    profiler.finish("bootstrap")
+
 bootstrap()
@@ -0,0 +1,198 @@
+"""
+Stand-ins for Katana's AssetAPI and for the Toolkit core, so that the Shotgun
+asset plug-in can be benchmarked and stress tested outside of Katana, without
+a Shotgun site or a pipeline configuration.
+
+The stub templates resolve in memory; abstract paths take DISK_LATENCY
+seconds to stand for the filesystem walk of the real core.
+"""
+import imp
+import os
+import re
+import sys
+import threading
+import time
+import types
+
+
+# Path of the asset plug-in, relative to this script
+PLUGIN_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Katana", "AssetPlugins", "ShotgunAssetPlugin.py"
+)
+
+# Seconds taken by abstract_paths_from_template, standing for a walk of the filesystem
+DISK_LATENCY = 0.001
+
+# Templates of the stub pipeline configuration: name -> (definition, abstract key names)
+TEMPLATES = {
+    "shot_render": ("sequences/{Sequence}/{Shot}/{Step}/render/{name}/v{version}/{name}.{SEQ}.exr", ("SEQ",)),
+    "asset_alembic": ("assets/{Asset}/{Step}/publish/{name}.v{version}.abc", ()),
+}
+
+_KEY = re.compile(r"{(\w+)}")
+
+
+class TankError(Exception):
+    pass
+
+
+class TemplateKey(object):
+    def __init__(self, name, abstract):
+        self.name = name
+        self.is_abstract = abstract
+        self.default = "%04d" if abstract else None
+        self.format_spec = None
+
+
+class Template(object):
+    def __init__(self, name, definition, abstractKeys, root):
+        self.name = name
+        self.definition = definition
+        self.root_path = root
+        self.keys = dict(
+            (key, TemplateKey(key, key in abstractKeys)) for key in _KEY.findall(definition)
+        )
+        self.applyCount = 0
+        self._countLock = threading.Lock()
+
+    def apply_fields(self, fields):
+        with self._countLock:
+            self.applyCount += 1
+        try:
+            return os.path.join(self.root_path, self.definition.format(**fields))
+        except KeyError, e:
+            raise TankError("Missing field %s" % e)
+
+    def get_fields(self, path):
+        # literal parts of the definition at even indices, key names at odd ones
+        parts = _KEY.split(os.path.join(self.root_path, self.definition))
+        pattern = ""
+        for (i, part) in enumerate(parts):
+            if not i % 2:
+                pattern += re.escape(part)
+            elif "(?P<%s>" % part in pattern:
+                pattern += "(?P=%s)" % part
+            else:
+                pattern += "(?P<%s>[^/]+?)" % part
+        match = re.match("^%s$" % pattern, path)
+        if not match:
+            raise TankError("%s does not match %s" % (path, self.name))
+        fields = match.groupdict()
+        if fields.get("version", "").isdigit():
+            fields["version"] = int(fields["version"])
+        return fields
+
+    def validate(self, path):
+        try:
+            self.get_fields(path)
+        except TankError:
+            return False
+        return True
+
+
+class PipelineConfiguration(object):
+    def __init__(self, path):
+        self._path = path
+
+    def get_path(self):
+        return self._path
+
+
+class Tank(object):
+    """
+    A Tank instance whose templates resolve in memory.
+    """
+    def __init__(self, root="/projects/stub"):
+        self.roots = {"primary": root}
+        self.pipeline_configuration = PipelineConfiguration(os.path.join(root, "config"))
+        self.templates = dict(
+            (name, Template(name, definition, abstractKeys, root))
+            for (name, (definition, abstractKeys)) in TEMPLATES.items()
+        )
+        self.abstractCount = 0
+        self._countLock = threading.Lock()
+
+    def abstract_paths_from_template(self, template, fields):
+        with self._countLock:
+            self.abstractCount += 1
+        time.sleep(DISK_LATENCY)
+        fields = dict(fields)
+        for key in template.keys.values():
+            fields.setdefault(key.name, key.default if key.is_abstract else "0")
+        return [template.apply_fields(fields)]
+
+
+def _installStubModules():
+    """
+    Registers stand-ins for the AssetAPI and tank modules, unless the real ones are importable.
+    """
+    try:
+        import AssetAPI
+    except ImportError:
+        AssetAPI = types.ModuleType("AssetAPI")
+        AssetAPI.BaseAssetPlugin = object
+        AssetAPI.RegisterAssetPlugin = lambda name, plugin: None
+        AssetAPI.GetDefaultFileSequencePlugin = lambda: None
+        sys.modules["AssetAPI"] = AssetAPI
+
+    try:
+        import tank
+    except ImportError:
+        tank = types.ModuleType("tank")
+        tank.TankError = TankError
+        tank.platform = types.ModuleType("tank.platform")
+        tank.platform.current_engine = lambda: None
+        tank.context = types.ModuleType("tank.context")
+        tank.util = types.ModuleType("tank.util")
+        sys.modules["tank"] = tank
+        sys.modules["tank.platform"] = tank.platform
+        sys.modules["tank.context"] = tank.context
+        sys.modules["tank.util"] = tank.util
+
+
+def loadPluginModule():
+    """
+    Returns the asset plug-in module, loaded with the stub modules.
+    """
+    module = sys.modules.get("ShotgunAssetPlugin")
+    if module is None:
+        _installStubModules()
+        # The stubs don't provide a resolution index
+        os.environ["TK_KATANA_RESOLUTION_INDEX"] = ""
+        module = imp.load_source("ShotgunAssetPlugin", PLUGIN_PATH)
+    return module
+
+
+def createPlugin(tk=None):
+    """
+    Returns a new asset plug-in using the given stub Tank instance, or a new one.
+    """
+    module = loadPluginModule()
+    plugin = module.ShotgunAssetPlugin()
+    plugin.tk = tk or Tank()
+    return plugin
+
+
+def makeAssetId(template, fields):
+    """
+    Returns the string of an asset ID, without whitespaces so that it can be
+    embedded in the strings given to resolveAllAssets.
+    """
+    return repr({"template": template, "fields": fields}).replace(" ", "")
+
+
+def makeAssetIds(count):
+    """
+    Returns count distinct asset ID strings, half of them fully specified and
+    half of them missing the abstract SEQ key.
+    """
+    assetIds = []
+    for i in xrange(count):
+        if i % 2:
+            fields = {"Asset": "prop%03d" % (i % 500), "Step": "model", "name": "main", "version": i}
+            assetIds.append(makeAssetId("asset_alembic", fields))
+        else:
+            fields = {"Sequence": "sq%02d" % (i % 40), "Shot": "sh%04d" % i, "Step": "light", "name": "beauty",
+                      "version": i}
+            assetIds.append(makeAssetId("shot_render", fields))
+    return assetIds
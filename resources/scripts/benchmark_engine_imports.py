@@ -0,0 +1,56 @@
+"""
+Benchmarks the imports of the engine on the startup paths of UI sessions and
+of headless batch and farm sessions, against the former eager imports of the
+task chooser and of the tk_katana package in every session. Each measure runs
+in a new Python process, outside of Katana, with the stubs of katana_stubs.py.
+
+Usage:
+    python benchmark_engine_imports.py [runs]
+"""
+import imp
+import os
+import subprocess
+import sys
+import time
+
+import katana_stubs
+
+
+# Modules imported on each startup path, after engine.py
+STARTUP_PATHS = (
+    # pre_app_init imports tk_katana to build the menu
+    ("ui", ["tk_katana"]),
+    # batch and farm sessions only import engine.py
+    ("headless", []),
+    # the former imports, made by every session
+    ("eager", ["rdokatana.taskChooser.taskChooser", "tk_katana"]),
+)
+
+
+def measure(path):
+    """
+    Returns the seconds taken to import the engine and the modules of a startup path.
+    """
+    katana_stubs.install()
+    startTime = time.time()
+    imp.load_source("tk_katana_engine", os.path.join(katana_stubs.ENGINE_PATH, "engine.py"))
+    for name in dict(STARTUP_PATHS)[path]:
+        __import__(name)
+    return time.time() - startTime
+
+
+def benchmark(runs):
+    print "%10s %12s %12s" % ("path", "median (s)", "min (s)")
+    for (path, modules) in STARTUP_PATHS:
+        durations = sorted(
+            float(subprocess.check_output([sys.executable, os.path.abspath(__file__), "--measure", path]))
+            for i in xrange(runs)
+        )
+        print "%10s %12.4f %12.4f" % (path, durations[len(durations) // 2], durations[0])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--measure":
+        print measure(sys.argv[2])
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,139 @@
+"""
+Benchmarks the lookup of the favourite commands by MenuGenerator.create_menu,
+through the app instance name and command indexes, against the former scan of
+every command for every favourite, for configurations with hundreds of
+commands and dozens of favourites. Also times whole menu builds and updates.
+Runs outside of Katana with the stubs of katana_stubs.py.
+
+Usage:
+    python benchmark_menu_index.py [runs]
+"""
+import random
+import sys
+import time
+
+import katana_stubs
+
+
+# (commands, favourites) of the benchmarked configurations
+CONFIGURATIONS = ((100, 12), (300, 24), (1000, 48))
+
+# Number of commands registered by each app
+COMMANDS_PER_APP = 5
+
+
+class App(object):
+    def __init__(self, engine, index):
+        self.engine = engine
+        self.display_name = "App %03d" % index
+        self.documentation_url = None
+
+
+class Engine(object):
+    """
+    Stands for the engine, with apps registering COMMANDS_PER_APP commands each.
+    """
+    context = "Shot sh0010, Lighting"
+
+    def __init__(self, commandCount, favouriteCount):
+        self.apps = {}
+        self.commands = {}
+        for index in xrange(commandCount // COMMANDS_PER_APP):
+            app = App(self, index)
+            self.apps["tk-multi-app%03d" % index] = app
+            for command in xrange(COMMANDS_PER_APP):
+                self.commands["App %03d command %d" % (index, command)] = {
+                    "properties": {"app": app}, "callback": lambda: None,
+                }
+        favourites = random.Random(0).sample(sorted(self.commands), favouriteCount)
+        self._settings = {"menu_favourites": [
+            {"app_instance": self.getAppInstanceName(name), "name": name} for name in favourites
+        ]}
+
+    def getAppInstanceName(self, commandName):
+        app = self.commands[commandName]["properties"]["app"]
+        return [name for (name, other) in self.apps.items() if other is app][0]
+
+    def get_setting(self, name, default=None):
+        return self._settings.get(name, default)
+
+
+def scanFavourites(engine, AppCommand):
+    """
+    The former lookup of the favourites: every command is compared with every
+    favourite, each comparison scanning the apps of the engine.
+    """
+    menuItems = [AppCommand(name, details) for (name, details) in engine.commands.items()]
+    favourites = []
+    for fav in engine.get_setting("menu_favourites"):
+        for cmd in menuItems:
+            if cmd.get_app_instance_name() == fav["app_instance"] and cmd.name == fav["name"]:
+                favourites.append(cmd)
+    return favourites
+
+
+def indexFavourites(engine, AppCommand):
+    """
+    The lookup of the favourites of create_menu, through the indexes.
+    """
+    appInstanceNames = dict((app, name) for (name, app) in engine.apps.items())
+    menuItems = [AppCommand(name, details, appInstanceNames) for (name, details) in engine.commands.items()]
+    commandsByKey = dict((cmd.get_key(), cmd) for cmd in menuItems)
+    favourites = []
+    for fav in engine.get_setting("menu_favourites"):
+        cmd = commandsByKey.get((fav["app_instance"], fav["name"]))
+        if cmd is not None:
+            favourites.append(cmd)
+    return favourites
+
+
+def timeCall(runs, func, *args):
+    """
+    Returns the best time of a number of calls, and the result of the last one.
+    """
+    best = None
+    for i in xrange(runs):
+        startTime = time.time()
+        result = func(*args)
+        duration = time.time() - startTime
+        best = duration if best is None else min(best, duration)
+    return (best, result)
+
+
+def createMenu(engine, menuName):
+    """
+    Builds the menu of the engine, or updates it if it exists.
+    """
+    from tk_katana import menu_generation
+    generator = menu_generation.MenuGenerator(engine, menuName)
+    generator.create_menu()
+    return generator
+
+
+def benchmark(runs):
+    katana_stubs.QT_IMPORT_LATENCY = 0
+    katana_stubs.install()
+    from tk_katana import menu_generation
+
+    print "%9s %11s %12s %12s %14s %15s" % (
+        "commands", "favourites", "scan (s)", "index (s)", "menu build (s)", "menu update (s)"
+    )
+    for (commandCount, favouriteCount) in CONFIGURATIONS:
+        engine = Engine(commandCount, favouriteCount)
+        (scan, scanned) = timeCall(runs, scanFavourites, engine, menu_generation.AppCommand)
+        (index, indexed) = timeCall(runs, indexFavourites, engine, menu_generation.AppCommand)
+        if [cmd.name for cmd in scanned] != [cmd.name for cmd in indexed]:
+            raise AssertionError("The scan and the indexes disagree for %d commands" % commandCount)
+
+        # a new root menu for each configuration, then updated in place as on file opens
+        menuName = "Shotgun %d" % commandCount
+        (build, generator) = timeCall(1, createMenu, engine, menuName)
+        (update, generator) = timeCall(runs, createMenu, engine, menuName)
+
+        print "%9d %11d %12.4f %12.4f %14.4f %15.4f" % (
+            commandCount, favouriteCount, scan, index, build, update
+        )
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
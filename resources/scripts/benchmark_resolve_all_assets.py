@@ -0,0 +1,73 @@
+"""
+Benchmarks ShotgunAssetPlugin.resolveAllAssets on strings embedding from 10 to
+10,000 asset IDs, among paths and flags as in procedural argument strings,
+against the former token by token str.replace implementation. Runs outside of
+Katana with the stubs of asset_plugin_stubs.py.
+
+Usage:
+    python benchmark_resolve_all_assets.py [max_ids]
+"""
+import sys
+import time
+
+import asset_plugin_stubs
+
+
+# Above this number of IDs, the naive implementation takes minutes and is skipped
+NAIVE_MAX_IDS = 1000
+
+
+def naiveResolveAllAssets(plugin, string):
+    """
+    The former implementation of resolveAllAssets, quadratic in the length of the string.
+    """
+    result = string
+    for token in string.split():
+        if plugin.isAssetId(token):
+            path = plugin.resolveAsset(token)
+            result = result.replace(token, path)
+    return result
+
+
+def makeString(assetIds):
+    """
+    Returns a procedural argument string embedding each asset ID twice, among flags and paths.
+    """
+    tokens = []
+    for (i, assetId) in enumerate(assetIds):
+        tokens.extend(["-input%d" % i, assetId, "-cache", "/tmp/cache/%d.abc" % i])
+    tokens.extend(["-refs"] + assetIds)
+    return " ".join(tokens)
+
+
+def timeCall(func, *args):
+    startTime = time.time()
+    result = func(*args)
+    return (time.time() - startTime, result)
+
+
+def benchmark(maxIds):
+    print "%8s %12s %12s %12s %10s" % ("IDs", "cold (s)", "warm (s)", "naive (s)", "us/ID warm")
+    count = 10
+    while count <= maxIds:
+        string = makeString(asset_plugin_stubs.makeAssetIds(count))
+
+        plugin = asset_plugin_stubs.createPlugin()
+        (cold, result) = timeCall(plugin.resolveAllAssets, string)
+        (warm, result) = timeCall(plugin.resolveAllAssets, string)
+
+        naive = "-"
+        if count <= NAIVE_MAX_IDS:
+            naivePlugin = asset_plugin_stubs.createPlugin()
+            naiveResolveAllAssets(naivePlugin, string)
+            (naiveTime, naiveResult) = timeCall(naiveResolveAllAssets, naivePlugin, string)
+            if naiveResult != result:
+                raise AssertionError("resolveAllAssets and the naive implementation disagree for %d IDs" % count)
+            naive = "%.4f" % naiveTime
+
+        print "%8d %12.4f %12.4f %12s %10.1f" % (count, cold, warm, naive, warm / count * 1e6)
+        count *= 10
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
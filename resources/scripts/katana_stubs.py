@@ -0,0 +1,236 @@
+"""
+Stand-ins for the Katana and rdokatana modules used by the engine, and for the
+Toolkit core when it is not importable, so that the engine's import paths and
+its menu generator can be benchmarked outside of Katana.
+
+The stub Qt widgets keep their children and actions in Python lists. Importing
+Katana's QtGui or the task chooser takes QT_IMPORT_LATENCY seconds, standing
+for the PyQt import of a real Katana session.
+"""
+import os
+import sys
+import time
+import types
+
+
+# Root of the engine, relative to this script
+ENGINE_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seconds taken by the import of the stub Qt modules, standing for the import of PyQt
+QT_IMPORT_LATENCY = 0.3
+
+# Values returned by the stub Katana.Configuration.get
+CONFIGURATION = {"KATANA_UI_MODE": True}
+
+
+class Signal(object):
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
+
+
+class QObject(object):
+    def __init__(self, parent=None):
+        self._parent = parent
+        self._children = []
+        self.destroyed = Signal()
+        if parent is not None:
+            parent._children.append(self)
+
+    def parent(self):
+        return self._parent
+
+    def children(self):
+        return list(self._children)
+
+    def deleteLater(self):
+        if self._parent is not None and self in self._parent._children:
+            self._parent._children.remove(self)
+        self.destroyed.emit()
+
+
+class QIcon(object):
+    def __init__(self, path=None):
+        self.path = path
+
+
+class QAction(QObject):
+    def __init__(self, *args, **kwargs):
+        if args and isinstance(args[0], basestring):
+            (self._text, parent) = (args[0], args[1] if len(args) > 1 else None)
+        else:
+            (self._text, parent) = ("", args[0] if args else None)
+        QObject.__init__(self, parent)
+        self.triggered = Signal()
+        if "triggered" in kwargs:
+            self.triggered.connect(kwargs["triggered"])
+        self._icon = None
+        self._separator = False
+
+    def text(self):
+        return self._text
+
+    def setText(self, text):
+        self._text = text
+
+    def setIcon(self, icon):
+        self._icon = icon
+
+    def setSeparator(self, separator):
+        self._separator = separator
+
+
+class QMenu(QObject):
+    def __init__(self, title="", parent=None):
+        QObject.__init__(self, parent)
+        self._title = title
+        self._actions = []
+        self._menuAction = QAction(title, self)
+        self.aboutToShow = Signal()
+
+    def title(self):
+        return self._title
+
+    def setTitle(self, title):
+        self._title = title
+
+    def menuAction(self):
+        return self._menuAction
+
+    def actions(self):
+        return list(self._actions)
+
+    def addAction(self, action):
+        self._actions.append(action)
+
+    def addActions(self, actions):
+        self._actions.extend(actions)
+
+    def removeAction(self, action):
+        self._actions.remove(action)
+
+    def addMenu(self, menu):
+        self._actions.append(menu.menuAction())
+
+    def clear(self):
+        self._actions = []
+
+
+class LayoutsMenu(QObject):
+    """
+    Stands for the Layouts menu of Katana, whose parent is the main menu bar.
+    """
+
+
+class QApplication(object):
+    def __init__(self):
+        self.mainMenu = QMenu("main")
+        self._topLevelWidgets = [LayoutsMenu(self.mainMenu)]
+
+    def topLevelWidgets(self):
+        return list(self._topLevelWidgets)
+
+
+def _makeQtGui():
+    time.sleep(QT_IMPORT_LATENCY)
+    module = types.ModuleType("Katana.QtGui")
+    for cls in (QObject, QIcon, QAction, QMenu):
+        setattr(module, cls.__name__, cls)
+    module.QMessageBox = module.QDesktopServices = object
+    module.qApp = QApplication()
+    return module
+
+
+def _makeQtCore():
+    module = types.ModuleType("Katana.QtCore")
+    module.QObject = QObject
+    module.QUrl = str
+    return module
+
+
+def _makeConfiguration():
+    module = types.ModuleType("Katana.Configuration")
+    module.get = lambda name, default=None: CONFIGURATION.get(name, default)
+    return module
+
+
+def _makeTaskChooser():
+    time.sleep(QT_IMPORT_LATENCY)
+    module = types.ModuleType("rdokatana.taskChooser.taskChooser")
+    module.TaskChooser = object
+    return module
+
+
+def _makePackage(name):
+    module = types.ModuleType(name)
+    module.__path__ = []
+    return module
+
+
+class _StubImporter(object):
+    """
+    Creates the stub modules when they are first imported, so that their import
+    cost is paid where the engine imports them.
+    """
+    MODULES = {
+        "Katana": lambda: _makePackage("Katana"),
+        "Katana.QtGui": _makeQtGui,
+        "Katana.QtCore": _makeQtCore,
+        "Katana.Configuration": _makeConfiguration,
+        "Katana.Callbacks": lambda: types.ModuleType("Katana.Callbacks"),
+        "rdokatana": lambda: _makePackage("rdokatana"),
+        "rdokatana.taskChooser": lambda: _makePackage("rdokatana.taskChooser"),
+        "rdokatana.taskChooser.taskChooser": _makeTaskChooser,
+    }
+
+    def find_module(self, fullname, path=None):
+        if fullname in self.MODULES:
+            return self
+        return None
+
+    def load_module(self, fullname):
+        module = sys.modules.get(fullname)
+        if module is None:
+            module = sys.modules[fullname] = self.MODULES[fullname]()
+            module.__loader__ = self
+            if "." in fullname:
+                (parent, name) = fullname.rsplit(".", 1)
+                setattr(sys.modules[parent], name, module)
+        return module
+
+
+def _installTankStub():
+    """
+    Registers a stand-in for the tank module, unless the real one is importable.
+    """
+    try:
+        import tank
+    except ImportError:
+        tank = types.ModuleType("tank")
+        tank.TankError = type("TankError", (Exception,), {})
+        tank.platform = types.ModuleType("tank.platform")
+        tank.platform.Engine = object
+        tank.platform.current_engine = lambda: None
+        tank.context = types.ModuleType("tank.context")
+        sys.modules["tank"] = tank
+        sys.modules["tank.platform"] = tank.platform
+        sys.modules["tank.context"] = tank.context
+
+
+def install():
+    """
+    Installs the stub modules, and the engine's python folder in sys.path so that
+    the tk_katana package can be imported.
+    """
+    if not any(isinstance(importer, _StubImporter) for importer in sys.meta_path):
+        sys.meta_path.append(_StubImporter())
+    _installTankStub()
+    pythonPath = os.path.join(ENGINE_PATH, "python")
+    if pythonPath not in sys.path:
+        sys.path.insert(0, pythonPath)
@@ -0,0 +1,83 @@
+"""
+Pre-warms the persistent resolution index of the Shotgun asset plug-in with
+all the asset IDs found in a Katana project, so that farm renders of that
+project find their paths in the index instead of deriving them from templates.
+
+Usage:
+    TK_KATANA_RESOLUTION_INDEX=/path/to/resolution_index.db \\
+        katana --script prewarm_resolution_index.py /path/to/project.katana
+"""
+import os
+import sys
+
+import NodegraphAPI
+from Katana import KatanaFile
+
+import sgtk
+
+
+def getPlugin():
+    """
+    Returns the instance of the Shotgun asset plug-in registered with Katana.
+    AssetAPI.GetAssetPlugin only exposes the AssetAPI methods of the plug-in.
+    """
+    for module in sys.modules.values():
+        moduleFile = getattr(module, "__file__", None) or ""
+        if os.path.basename(moduleFile).startswith("ShotgunAssetPlugin.py") and hasattr(module, "plugin"):
+            return module.plugin
+
+    # Not loaded by Katana yet
+    sys.path.insert(0, os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Katana", "AssetPlugins"
+    ))
+    import ShotgunAssetPlugin
+    return ShotgunAssetPlugin.plugin
+
+
+def iterStringParameterValues(parameter):
+    """
+    Yields the values of all the string parameters under the given parameter.
+    """
+    if parameter.getType() == "string":
+        yield parameter.getValue(0)
+    for child in parameter.getChildren() or []:
+        for value in iterStringParameterValues(child):
+            yield value
+
+
+def prewarm(katanaFile):
+    """
+    Resolves every asset ID found in the parameters of the given Katana project.
+    Returns the number of distinct asset IDs resolved.
+    """
+    plugin = getPlugin()
+    if plugin.tk is None:
+        # Not launched from Shotgun, find the pipeline configuration from the project
+        plugin.tk = sgtk.sgtk_from_path(katanaFile)
+    if plugin.getResolutionIndex() is None:
+        raise RuntimeError("The resolution index is disabled, set TK_KATANA_RESOLUTION_INDEX.")
+
+    KatanaFile.Load(katanaFile)
+
+    assetIds = set()
+    for node in NodegraphAPI.GetAllNodes():
+        for value in iterStringParameterValues(node.getParameters()):
+            if plugin.isAssetId(value):
+                assetIds.add(value)
+                continue
+            for token in value.split():
+                if plugin.isAssetId(token):
+                    assetIds.add(token)
+
+    for assetId in assetIds:
+        plugin.resolveAsset(assetId)
+    plugin.getResolutionIndex().flush()
+    return len(assetIds)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print __doc__
+        sys.exit(1)
+    count = prewarm(sys.argv[1])
+    print "Resolved %d asset IDs from %s" % (count, sys.argv[1])
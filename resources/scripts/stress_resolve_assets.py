@@ -0,0 +1,74 @@
+"""
+Stress test of concurrent asset resolution, as done by Katana's multithreaded
+Geolib cooking: N threads resolve the same large set of asset IDs in different
+orders. Checks that every thread gets the expected paths, that each asset ID
+is only resolved once through the templates (single-flight), and reports the
+throughput. Runs outside of Katana with the stubs of asset_plugin_stubs.py.
+
+Usage:
+    python stress_resolve_assets.py [threads] [asset_ids]
+"""
+import random
+import sys
+import threading
+import time
+
+import asset_plugin_stubs
+
+
+def getExpectedPaths(assetIds):
+    """
+    Returns the paths of the given asset IDs, resolved from a single thread.
+    """
+    plugin = asset_plugin_stubs.createPlugin()
+    return dict((assetId, plugin.resolveAsset(assetId)) for assetId in assetIds)
+
+
+def stress(threadCount, assetIdCount):
+    assetIds = asset_plugin_stubs.makeAssetIds(assetIdCount)
+    expectedPaths = getExpectedPaths(assetIds)
+    plugin = asset_plugin_stubs.createPlugin()
+
+    errors = []
+    start = threading.Event()
+
+    def resolveAll(seed):
+        order = list(assetIds)
+        random.Random(seed).shuffle(order)
+        start.wait()
+        try:
+            for assetId in order:
+                path = plugin.resolveAsset(assetId)
+                if path != expectedPaths[assetId]:
+                    errors.append("%s resolved to %s instead of %s" % (assetId, path, expectedPaths[assetId]))
+        except Exception, e:
+            errors.append("%s: %s" % (type(e).__name__, e))
+
+    threads = [threading.Thread(target=resolveAll, args=(i,)) for i in xrange(threadCount)]
+    for thread in threads:
+        thread.start()
+    startTime = time.time()
+    start.set()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - startTime
+
+    resolutions = sum(
+        stats["applyFields"] + stats["abstractPaths"] for stats in plugin.getTemplateStatistics().itervalues()
+    )
+    if resolutions != assetIdCount:
+        errors.append("%d template resolutions for %d distinct asset IDs" % (resolutions, assetIdCount))
+
+    calls = threadCount * assetIdCount
+    print "%d threads, %d asset IDs: %d resolves in %.3fs, %.0f resolves/s, %d template resolutions" % (
+        threadCount, assetIdCount, calls, duration, calls / duration, resolutions
+    )
+    for error in errors[:20]:
+        print "ERROR: %s" % error
+    return not errors
+
+
+if __name__ == "__main__":
+    threadCount = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    assetIdCount = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    sys.exit(0 if stress(threadCount, assetIdCount) else 1)